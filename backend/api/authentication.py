@@ -0,0 +1,114 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import authentication
+
+from api.cache import bump_generation, get_generation
+from api.replicas import use_primary
+
+TOKEN_KEY = 'auth-token:{}'
+USER_LABEL = 'auth-user:{}'
+
+
+def token_key(key):
+    return TOKEN_KEY.format(hashlib.md5(key.encode()).hexdigest())
+
+
+def invalidate_user_tokens(user_id):
+    '''Сбрасывает закэшированные токены пользователя во всех процессах,
+    которые делят кэш'''
+    bump_generation(USER_LABEL.format(user_id))
+
+
+def without_password(user):
+    '''Копия пользователя только с его полями: без хэша пароля (поле
+    становится отложенным) и без связанного токена'''
+    names = [field.attname for field in user._meta.concrete_fields
+             if field.name != 'password']
+    return type(user).from_db(
+        user._state.db, names, [getattr(user, name) for name in names])
+
+
+class TokenCache:
+    '''Токены в памяти процесса: не больше TOKEN_CACHE_SIZE последних,
+    каждый не дольше TOKEN_CACHE_SECONDS секунд'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (
+                time.monotonic() + settings.TOKEN_CACHE_SECONDS, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class TokenAuthentication(authentication.TokenAuthentication):
+    '''Токен с пользователем кэшируется в памяти процесса и в кэше
+    Django. Запись действует, пока не сменилось поколение пользователя:
+    его сбрасывают выход, смена пароля и любое изменение пользователя.
+    В кэш не попадают ни сам токен (ключ записи - его хэш), ни хэш
+    пароля: поле password становится отложенным и при обращении
+    читается из базы.
+
+    Токен ищется в основной базе: только что выданный токен могла
+    еще не получить реплика, а удаленный - еще не удалить'''
+
+    def authenticate_credentials(self, key):
+        if settings.TOKEN_CACHE_SECONDS <= 0:
+            return self.load(key)
+        cache_key = token_key(key)
+        entry = token_cache.get(cache_key)
+        if entry is None:
+            entry = cache.get(cache_key)
+        if entry is not None:
+            user, created, generation = entry
+            if get_generation(USER_LABEL.format(user.pk)) == generation:
+                token_cache.set(cache_key, entry)
+                return self.restore(key, user, created)
+        user, token = self.load(key)
+        # Поколение сбрасывается после фиксации изменения, поэтому
+        # прочитанный до изменения пользователь получает прежнее поколение
+        # и сразу устаревает. Узкое окно между чтением из базы и чтением
+        # поколения ограничено TOKEN_CACHE_SECONDS.
+        entry = (without_password(user), token.created,
+                 get_generation(USER_LABEL.format(user.pk)))
+        token_cache.set(cache_key, entry)
+        cache.set(cache_key, entry, settings.TOKEN_CACHE_SECONDS)
+        return user, token
+
+    def restore(self, key, user, created):
+        # Копия, чтобы изменения request.user в одном запросе не
+        # попали в закэшированный объект
+        user = copy.copy(user)
+        return user, self.get_model()(key=key, user=user, created=created)
+
+    def load(self, key):
+        with use_primary():
+            return super().authenticate_credentials(key)
@@ -0,0 +1,73 @@
+from bisect import bisect_left
+
+from django.contrib.postgres.search import TrigramSimilarity
+
+from api.catalogue import Catalogue
+from api.constants import TRIGRAM_MIN_QUERY_LENGTH
+from recipes.models import Ingredient
+
+
+class IngredientIndex(Catalogue):
+    '''Справочник ингредиентов в памяти процесса для автодополнения.
+
+    Названия хранятся отсортированными в верхнем регистре, поэтому
+    префиксный поиск сводится к бинарному поиску. Индекс
+    перестраивается, когда меняется поколение модели Ingredient.'''
+    model = Ingredient
+
+    def __init__(self):
+        super().__init__()
+        self.keys = []
+        self.items = []
+
+    def load(self):
+        rows = sorted(
+            (name.upper(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'))
+        self.keys = [row[0] for row in rows]
+        self.items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows]
+        return self.items
+
+    def all(self):
+        self.ensure_loaded()
+        return list(self.items)
+
+    def search(self, query, limit):
+        '''Сначала совпадения по префиксу, затем по подстроке'''
+        self.ensure_loaded()
+        query = query.upper()
+        keys, items = self.keys, self.items
+        result = []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(query)):
+            result.append(items[position])
+            position += 1
+        if len(result) < limit:
+            for key, item in zip(keys, items):
+                if query in key and not key.startswith(query):
+                    result.append(item)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
+
+
+def autocomplete(query, limit):
+    '''Подсказки ингредиентов: префикс и подстрока из памяти. Только
+    если в памяти ничего не нашлось (например, запрос с опечаткой),
+    выполняется нечеткий поиск по pg_trgm-индексу в базе'''
+    result = ingredient_index.search(query, limit)
+    if result or len(query) < TRIGRAM_MIN_QUERY_LENGTH:
+        return result
+    return list(Ingredient.objects.filter(
+        name__trigram_similar=query,
+    ).annotate(
+        similarity=TrigramSimilarity('name', query),
+    ).order_by('-similarity').values(
+        'id', 'name', 'measurement_unit')[:limit])
@@ -0,0 +1,170 @@
+'''Пакетное создание рецептов.
+
+Записи - JSON-объекты в формате BulkRecipeSerializer, по одному на
+строку (JSON lines). Они читаются потоком и обрабатываются пачками:
+поля проверяются сериализатором, теги, ингредиенты и авторы всей пачки
+ищутся одним запросом на модель, а рецепты и их связи вставляются
+через bulk_create в отдельной транзакции на пачку. Ошибка в записи
+попадает в ее результат и не прерывает загрузку остальных.'''
+import json
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, transaction
+
+from api import counters, images
+from api.cache import bump_generation
+from api.serializers import BulkRecipeSerializer
+from recipes.loaders import batches
+from recipes.models import (Ingredient, IngredientRecipe, Recipe, Tag,
+                            TagsRecipe)
+
+User = get_user_model()
+
+CHANGED_MODELS = (Recipe, TagsRecipe, IngredientRecipe)
+
+
+def parse_lines(lines):
+    '''(номер строки, объект или None, ошибка или None) для каждой
+    непустой строки'''
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield number, None, f'Некорректный JSON: {error}'
+            continue
+        if not isinstance(record, dict):
+            yield number, None, 'Ожидается JSON-объект'
+            continue
+        yield number, record, None
+
+
+def parse_list(items):
+    '''То же, что parse_lines, для уже разобранного JSON-массива'''
+    for number, record in enumerate(items, start=1):
+        if isinstance(record, dict):
+            yield number, record, None
+        else:
+            yield number, None, 'Ожидается JSON-объект'
+
+
+def limited(records, limit):
+    '''Первые limit записей. Если записей больше, первая лишняя получает
+    одну ошибку на весь остаток, а дальше тело запроса не читается.'''
+    for index, (number, record, error) in enumerate(records):
+        if index >= limit:
+            yield number, None, (f'Не больше {limit} рецептов за запрос, '
+                                 f'записи с этой строки не загружены')
+            return
+        yield number, record, error
+
+
+def import_recipes(records, chunk_size, author=None):
+    '''Создает рецепты из записей parse_lines. Если author не задан,
+    автор берется из поля author записи (username). Возвращает
+    результаты по записям: {'line', 'id'} или {'line', 'errors'}.'''
+    for chunk in batches(records, chunk_size):
+        yield from import_chunk(chunk, author)
+
+
+def import_chunk(chunk, author):
+    results = {}
+    valid = []
+    for number, record, error in chunk:
+        if error:
+            results[number] = {'line': number, 'errors': error}
+            continue
+        serializer = BulkRecipeSerializer(data=record)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+        else:
+            results[number] = {'line': number, 'errors': serializer.errors}
+
+    valid = resolve_relations(valid, results, author)
+    if valid:
+        try:
+            with transaction.atomic():
+                ids = insert(valid)
+        except DatabaseError as error:
+            for number, _ in valid:
+                results[number] = {'line': number, 'errors': str(error)}
+        else:
+            for (number, _), recipe_id in zip(valid, ids):
+                results[number] = {'line': number, 'id': recipe_id}
+    return [results[number] for number, *_ in chunk]
+
+
+def resolve_relations(valid, results, author):
+    '''Проверяет теги, ингредиенты и авторов всей пачки тремя
+    запросами; записи со ссылками на несуществующие объекты
+    получают ошибку'''
+    tag_ids = set(Tag.objects.filter(id__in={
+        tag for _, data in valid for tag in data['tags']
+    }).values_list('id', flat=True))
+    ingredient_ids = set(Ingredient.objects.filter(id__in={
+        item['id'] for _, data in valid for item in data['ingredients']
+    }).values_list('id', flat=True))
+    authors = {}
+    if author is None:
+        authors = dict(User.objects.filter(username__in={
+            data.get('author') for _, data in valid
+        }).values_list('username', 'id'))
+
+    resolved = []
+    for number, data in valid:
+        errors = {}
+        missing_tags = set(data['tags']) - tag_ids
+        if missing_tags:
+            errors['tags'] = f'Нет тегов: {sorted(missing_tags)}'
+        missing_ingredients = {
+            item['id'] for item in data['ingredients']} - ingredient_ids
+        if missing_ingredients:
+            errors['ingredients'] = (
+                f'Нет ингредиентов: {sorted(missing_ingredients)}')
+        if author is not None:
+            data['author_id'] = author.id
+        elif data.get('author') in authors:
+            data['author_id'] = authors[data['author']]
+        else:
+            errors['author'] = 'Автор не найден'
+        if errors:
+            results[number] = {'line': number, 'errors': errors}
+        else:
+            resolved.append((number, data))
+    return resolved
+
+
+def insert(valid):
+    recipes = Recipe.objects.bulk_create(
+        Recipe(author_id=data['author_id'], name=data['name'],
+               text=data['text'], cooking_time=data['cooking_time'],
+               image=data.get('image') or '')
+        for _, data in valid)
+    TagsRecipe.objects.bulk_create(
+        TagsRecipe(recipe=recipe, tag_id=tag)
+        for recipe, (_, data) in zip(recipes, valid)
+        for tag in set(data['tags']))
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(recipe=recipe, ingredient_id=item['id'],
+                         amount=item['amount'])
+        for recipe, (_, data) in zip(recipes, valid)
+        for item in data['ingredients'])
+    # bulk_create не вызывает сигналы: счетчики авторов, варианты
+    # картинок и поколения кэша обновляются здесь.
+    for author_id, created in Counter(
+            recipe.author_id for recipe in recipes).items():
+        counters.change_author_counter(author_id, created)
+    names = {recipe.image.name for recipe in recipes if recipe.image}
+    transaction.on_commit(lambda: finish(names))
+    return [recipe.id for recipe in recipes]
+
+
+def finish(image_names):
+    for model in CHANGED_MODELS:
+        bump_generation(model._meta.label_lower)
+    for name in image_names:
+        images.schedule_variants(name)
@@ -0,0 +1,58 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = 'generation:{}'
+STATS_KEY = 'response-cache:{}'
+
+
+def get_generations(*labels):
+    '''Текущие поколения моделей. Поколение - случайный токен,
+    который меняется при любом изменении модели, поэтому вытеснение
+    ключа из кэша тоже приводит к сбросу, а не к устаревшим данным.
+    В кэше процесса поколения истекают через CACHE_GENERATION_TIMEOUT,
+    чтобы до процесса доходили изменения, сделанные другими.'''
+    keys = [GENERATION_KEY.format(label) for label in labels]
+    generations = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys
+               if key not in generations}
+    if missing:
+        cache.set_many(missing, settings.CACHE_GENERATION_TIMEOUT)
+        generations.update(missing)
+    return [generations[key] for key in keys]
+
+
+def get_generation(label):
+    return get_generations(label)[0]
+
+
+def bump_generation(label):
+    cache.set(GENERATION_KEY.format(label), uuid.uuid4().hex,
+              settings.CACHE_GENERATION_TIMEOUT)
+
+
+def make_key(prefix, generations, *parts):
+    digest = hashlib.md5(
+        ':'.join(map(str, (*generations, *parts))).encode()).hexdigest()
+    return f'{prefix}:{digest}'
+
+
+def count(event):
+    key = STATS_KEY.format(event)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_stats():
+    '''Попадания и промахи кэша ответов для анонимных пользователей'''
+    keys = {event: STATS_KEY.format(event) for event in ('hit', 'miss')}
+    values = cache.get_many(keys.values())
+    stats = {event: values.get(key, 0) for event, key in keys.items()}
+    total = stats['hit'] + stats['miss']
+    stats['hit_ratio'] = round(stats['hit'] / total, 4) if total else None
+    return stats
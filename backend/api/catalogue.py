@@ -0,0 +1,107 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+from api.cache import get_generation
+from api.replicas import use_primary
+from api.serializers import TagSerializer
+from recipes.models import Tag
+
+
+class Catalogue:
+    '''Справочник в памяти процесса. Перезагружается, когда меняется
+    поколение модели (его сбрасывают сигналы), и хранит отпечаток
+    содержимого и время его изменения для условных GET-запросов.'''
+    model = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.digest = None
+        self.last_modified = None
+
+    def load(self):
+        '''Загружает справочник и возвращает его содержимое для
+        отпечатка'''
+        raise NotImplementedError
+
+    def ensure_loaded(self):
+        version = get_generation(self.model._meta.label_lower)
+        if self.version != version:
+            with self.lock:
+                if self.version != version:
+                    self.reload(version)
+
+    def reload(self, version):
+        # Справочник живет до следующего поколения, поэтому читается с
+        # основной базы, а не с реплики, которая могла еще не получить
+        # изменение
+        with use_primary():
+            items = self.load()
+        content = json.dumps(items, ensure_ascii=False, sort_keys=True,
+                             default=str)
+        digest = hashlib.md5(content.encode()).hexdigest()
+        if digest != self.digest:
+            # Last-Modified с точностью до секунды: новое значение всегда
+            # больше прежнего, чтобы изменение в ту же секунду не дало
+            # ложный 304
+            now = datetime.now(timezone.utc).replace(microsecond=0)
+            last_modified = now + timedelta(seconds=1)
+            if self.last_modified is not None:
+                last_modified = max(
+                    last_modified, self.last_modified + timedelta(seconds=1))
+            self.last_modified = last_modified
+            self.digest = digest
+        self.version = version
+
+    def etag(self, request, *args, **kwargs):
+        self.ensure_loaded()
+        return self.digest
+
+    def modified(self, request, *args, **kwargs):
+        self.ensure_loaded()
+        return self.last_modified
+
+
+class TagCatalogue(Catalogue):
+    '''Теги в том виде, в котором их отдает API, и соответствие
+    слагов id для фильтра рецептов'''
+    model = Tag
+
+    def __init__(self):
+        super().__init__()
+        self.items = []
+        self.by_id = {}
+        self.by_slug = {}
+
+    def load(self):
+        items = [dict(item) for item in TagSerializer(
+            self.model.objects.all(), many=True).data]
+        self.by_id = {item['id']: item for item in items}
+        self.by_slug = {item['slug']: item['id'] for item in items}
+        self.items = items
+        return items
+
+    def all(self):
+        self.ensure_loaded()
+        return list(self.items)
+
+    def get(self, pk):
+        self.ensure_loaded()
+        return self.by_id.get(pk)
+
+    def ids(self, slugs):
+        self.ensure_loaded()
+        return [self.by_slug[slug] for slug in slugs if slug in self.by_slug]
+
+    def choices(self):
+        self.ensure_loaded()
+        return [(slug, slug) for slug in self.by_slug]
+
+
+tag_catalogue = TagCatalogue()
+
+
+def tag_choices():
+    return tag_catalogue.choices()
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.db import connections
+
+
+def close_unusable_connections(**kwargs):
+    '''Закрывает открытые соединения текущего потока, которые больше
+    не отвечают (база перезапущена, пулер закрыл соединение), чтобы
+    запрос открыл новое. Работает при DB_CONN_HEALTH_CHECKS.'''
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
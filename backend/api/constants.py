@@ -3,6 +3,22 @@ MAX_LENGTH_USERNAME = 150
 MAX_LENGTH_NAME = 200
 MAX_LENGTH_COLOR = 7
 
+INGREDIENTS_SEARCH_LIMIT = 20
+TRIGRAM_MIN_QUERY_LENGTH = 3
+
+IMAGE_THUMBNAIL_SIZE = (480, 480)
+IMAGE_WEBP_QUALITY = 80
+BASE64_CHUNK_SIZE = 64 * 1024
+
+SEARCH_CONFIG = 'russian'
+MATCH_MAX_INGREDIENTS = 50
+BULK_RECIPES_LIMIT = 1000
+BULK_CHUNK_SIZE = 200
+
+POPULARITY_HALF_LIFE_DAYS = 7
+POPULARITY_FAVORITE_WEIGHT = 1.0
+POPULARITY_CART_WEIGHT = 0.5
+
 PINK = '#F08080'
 ORANGE = '#FF8C00'
 BLUE = '#7FFFD4'
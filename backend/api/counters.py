@@ -0,0 +1,158 @@
+'''Денормализованные счетчики.
+
+Recipe.favorites_count, Recipe.in_carts_count и AuthorStats.recipes_count
+меняются одним UPDATE с F()-выражением при создании и удалении связей,
+поэтому чтение счетчика не требует COUNT(*). Массовые вставки сигналов
+не вызывают, расхождения исправляет команда reconcile_counters.'''
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F, Max, Min
+from django.db.models.functions import Greatest
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import AuthorStats
+
+User = get_user_model()
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+COUNTED_FIELDS = {
+    Favorite: 'recipe',
+    ShoppingCart: 'recipe',
+    Recipe: 'author',
+}
+
+UPSERT_AUTHOR_SQL = '''
+INSERT INTO {table} (user_id, recipes_count) VALUES (%s, %s)
+ON CONFLICT (user_id) DO UPDATE
+SET recipes_count = {table}.recipes_count + EXCLUDED.recipes_count
+'''
+
+
+def change_author_counter(author_id, delta):
+    '''Строка статистики автора создается при первом рецепте. При
+    уменьшении строка не создается: автор может удаляться вместе с ней.'''
+    if delta < 0:
+        AuthorStats.objects.filter(user_id=author_id).update(
+            recipes_count=Greatest(F('recipes_count') + delta, 0))
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_AUTHOR_SQL.format(table=AuthorStats._meta.db_table),
+            [author_id, delta])
+
+
+def counted_target(instance):
+    '''id объекта, чей счетчик учитывает instance'''
+    field = instance._meta.get_field(COUNTED_FIELDS[type(instance)])
+    return getattr(instance, field.attname)
+
+
+def change_counter(model, target_id, delta):
+    if target_id is None:
+        return
+    if model is Recipe:
+        change_author_counter(target_id, delta)
+        return
+    field = RECIPE_COUNTERS[model]
+    Recipe.objects.filter(pk=target_id).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def author_recipes_count(user):
+    return AuthorStats.objects.filter(user=user).values_list(
+        'recipes_count', flat=True).first() or 0
+
+
+RECONCILE_RECIPES_SQL = '''
+WITH favorites AS (
+    SELECT recipe_id, COUNT(*) AS total FROM {favorites}
+    WHERE recipe_id >= %(first)s AND recipe_id < %(last)s
+    GROUP BY recipe_id
+), carts AS (
+    SELECT recipe_id, COUNT(*) AS total FROM {carts}
+    WHERE recipe_id >= %(first)s AND recipe_id < %(last)s
+    GROUP BY recipe_id
+), actual AS (
+    SELECT recipe.id,
+           COALESCE(favorites.total, 0) AS favorites_count,
+           COALESCE(carts.total, 0) AS in_carts_count
+    FROM {recipes} AS recipe
+    LEFT JOIN favorites ON favorites.recipe_id = recipe.id
+    LEFT JOIN carts ON carts.recipe_id = recipe.id
+    WHERE recipe.id >= %(first)s AND recipe.id < %(last)s
+)
+UPDATE {recipes} AS recipe
+SET favorites_count = actual.favorites_count,
+    in_carts_count = actual.in_carts_count
+FROM actual
+WHERE recipe.id = actual.id
+  AND (recipe.favorites_count, recipe.in_carts_count)
+      IS DISTINCT FROM (actual.favorites_count, actual.in_carts_count)
+'''
+
+RECONCILE_AUTHORS_SQL = '''
+WITH actual AS (
+    SELECT author_id AS user_id, COUNT(*) AS recipes_count FROM {recipes}
+    WHERE author_id >= %(first)s AND author_id < %(last)s
+    GROUP BY author_id
+), missing AS (
+    INSERT INTO {stats} (user_id, recipes_count)
+    SELECT user_id, recipes_count FROM actual
+    ON CONFLICT (user_id) DO UPDATE
+    SET recipes_count = EXCLUDED.recipes_count
+    WHERE {stats}.recipes_count <> EXCLUDED.recipes_count
+    RETURNING user_id
+), emptied AS (
+    UPDATE {stats} AS stats SET recipes_count = 0
+    WHERE stats.user_id >= %(first)s AND stats.user_id < %(last)s
+      AND stats.recipes_count <> 0
+      AND stats.user_id NOT IN (SELECT user_id FROM actual)
+    RETURNING user_id
+)
+SELECT (SELECT COUNT(*) FROM missing) + (SELECT COUNT(*) FROM emptied)
+'''
+
+
+def reconcile_recipes(first_id, last_id):
+    '''Пересчитывает счетчики рецептов с id в [first_id, last_id).
+    Обновляются только разошедшиеся строки, возвращается их число.'''
+    with connection.cursor() as cursor:
+        cursor.execute(RECONCILE_RECIPES_SQL.format(
+            recipes=Recipe._meta.db_table,
+            favorites=Favorite._meta.db_table,
+            carts=ShoppingCart._meta.db_table,
+        ), {'first': first_id, 'last': last_id})
+        return cursor.rowcount
+
+
+def reconcile_authors(first_id, last_id):
+    '''Пересчитывает число рецептов авторов с id в [first_id, last_id).
+    Недостающие строки статистики создаются.'''
+    with connection.cursor() as cursor:
+        cursor.execute(RECONCILE_AUTHORS_SQL.format(
+            recipes=Recipe._meta.db_table,
+            stats=AuthorStats._meta.db_table,
+        ), {'first': first_id, 'last': last_id})
+        return cursor.fetchone()[0]
+
+
+def id_ranges(model, batch_size):
+    bounds = model.objects.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return
+    for first_id in range(bounds['first'], bounds['last'] + 1, batch_size):
+        yield first_id, first_id + batch_size
+
+
+def reconcile(batch_size):
+    '''Пересчитывает все счетчики пачками по batch_size строк.
+    Для каждой пачки возвращает (что считали, диапазон id, исправлено).'''
+    for name, model, reconcile_range in (
+            ('recipes', Recipe, reconcile_recipes),
+            ('authors', User, reconcile_authors)):
+        for first_id, last_id in id_ranges(model, batch_size):
+            yield (name, first_id, last_id,
+                   reconcile_range(first_id, last_id))
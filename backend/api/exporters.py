@@ -0,0 +1,40 @@
+import csv
+import json
+
+
+class Echo:
+    '''Файлоподобный объект для csv.writer: возвращает строку,
+    а не пишет ее в буфер'''
+    def write(self, value):
+        return value
+
+
+def export_txt(ingredients):
+    for ingredient in ingredients:
+        yield (f"{ingredient['name']} - {ingredient['amount']}"
+               f" {ingredient['measurement_unit']}\n")
+
+
+def export_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((ingredient['name'],
+                               ingredient['measurement_unit'],
+                               ingredient['amount']))
+
+
+def export_json(ingredients):
+    yield '['
+    separator = ''
+    for ingredient in ingredients:
+        yield separator + json.dumps(ingredient, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+EXPORTERS = {
+    'txt': export_txt,
+    'csv': export_csv,
+    'json': export_json,
+}
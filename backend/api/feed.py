@@ -0,0 +1,89 @@
+'''Лента рецептов авторов, на которых подписан пользователь.
+
+По умолчанию лента собирается при чтении одним соединением рецептов
+с подписками (индекс recipe_author_date_idx). Для пользователей с
+большим числом подписок лента хранится готовой в FeedEntry: ее
+заполняют materialize_feeds, а поддерживают триггеры PostgreSQL, и
+страница читается по индексу feed_entry_date_idx без сортировки
+рецептов всех авторов.'''
+from django.db import connection
+from django.db.models import Count, F
+
+from recipes.models import FeedEntry, MaterializedFeed
+
+JOIN = 'join'
+MATERIALIZED = 'materialized'
+FEED_ORDERINGS = {
+    JOIN: ('-pub_date', '-id'),
+    MATERIALIZED: ('-feed_pub_date', '-feed_recipe_id'),
+}
+
+MATERIALIZE_SQL = '''
+WITH feeds AS (
+    INSERT INTO recipes_materializedfeed (user_id, created)
+    SELECT user_id, NOW() FROM users_follow
+    WHERE %(user_ids)s::bigint[] IS NULL OR user_id = ANY(%(user_ids)s)
+    GROUP BY user_id HAVING COUNT(*) >= %(min_follows)s
+    ON CONFLICT DO NOTHING
+    RETURNING user_id
+)
+INSERT INTO recipes_feedentry (feed_id, recipe_id, pub_date)
+SELECT feeds.user_id, recipe.id, recipe.pub_date
+FROM feeds
+JOIN users_follow AS follow ON follow.user_id = feeds.user_id
+JOIN recipes_recipe AS recipe ON recipe.author_id = follow.author_id
+ON CONFLICT DO NOTHING
+'''
+
+REFRESH_SQL = '''
+INSERT INTO recipes_feedentry (feed_id, recipe_id, pub_date)
+SELECT feed.user_id, recipe.id, recipe.pub_date
+FROM recipes_materializedfeed AS feed
+JOIN users_follow AS follow ON follow.user_id = feed.user_id
+JOIN recipes_recipe AS recipe ON recipe.author_id = follow.author_id
+ON CONFLICT DO NOTHING
+'''
+
+
+def feed_recipes(queryset, user, strategy=None):
+    '''Рецепты ленты user и порядок для keyset-пагинации. Без strategy
+    используется готовая лента, если она есть у пользователя.'''
+    if strategy is None:
+        strategy = (MATERIALIZED if MaterializedFeed.objects.filter(
+            user=user).exists() else JOIN)
+    if strategy == MATERIALIZED:
+        queryset = queryset.filter(feed_entries__feed=user.id).annotate(
+            feed_pub_date=F('feed_entries__pub_date'),
+            feed_recipe_id=F('feed_entries__recipe_id'))
+    else:
+        queryset = queryset.filter(author__following__user=user)
+    return queryset, FEED_ORDERINGS[strategy]
+
+
+def materialize(min_follows, user_ids=None):
+    '''Заводит готовые ленты пользователям (всем или из user_ids),
+    у которых не меньше min_follows подписок, и заполняет их.
+    Возвращает число записей.'''
+    with connection.cursor() as cursor:
+        cursor.execute(MATERIALIZE_SQL, {'min_follows': min_follows,
+                                         'user_ids': user_ids})
+        return cursor.rowcount
+
+
+def refresh():
+    '''Дописывает в готовые ленты пропущенные записи, например рецепты,
+    добавленные параллельно с materialize'''
+    with connection.cursor() as cursor:
+        cursor.execute(REFRESH_SQL)
+        return cursor.rowcount
+
+
+def drop(max_follows):
+    '''Удаляет готовые ленты пользователей, у которых меньше
+    max_follows подписок. Возвращает число удаленных лент.'''
+    feeds = MaterializedFeed.objects.annotate(
+        follows=Count('user__follower')).filter(
+        follows__lt=max_follows).values('user')
+    FeedEntry.objects.filter(feed__in=feeds).delete()
+    deleted, _ = MaterializedFeed.objects.filter(user__in=feeds).delete()
+    return deleted
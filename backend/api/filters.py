@@ -1,15 +1,24 @@
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Tag, Recipe
+from api.catalogue import tag_catalogue, tag_choices
+from api.search import search_recipes
+from recipes.models import Recipe
 
 User = get_user_model()
 
+RECIPE_ORDERINGS = {
+    'new': ('-pub_date', '-id'),
+    'popular': ('-popularity', '-id'),
+    'quick': ('cooking_time', '-id'),
+}
+DEFAULT_RECIPE_ORDERING = 'new'
+SEARCH_ORDERING = ('-rank', '-id')
+
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(field_name='tags__slug',
-                                             to_field_name='slug',
-                                             queryset=Tag.objects.all())
+    tags = filters.MultipleChoiceFilter(choices=tag_choices,
+                                        method='tags_method')
     author = filters.ModelChoiceFilter(
         queryset=User.objects.all(),
     )
@@ -17,11 +26,19 @@ class RecipeFilter(FilterSet):
         method='is_favorited_method')
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_method')
+    search = filters.CharFilter(method='search_method')
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERINGS],
+        method='ordering_method')
 
     class Meta:
         model = Recipe
         fields = ('author', 'tags')
 
+    def tags_method(self, queryset, name, value):
+        return queryset.filter(
+            tags__in=tag_catalogue.ids(value)).distinct()
+
     def is_favorited_method(self, queryset, name, value):
         user = self.request.user
         if user.is_anonymous:
@@ -37,3 +54,9 @@ class RecipeFilter(FilterSet):
         if value:
             return queryset.filter(shopping_cart_recipe__user=user)
         return queryset
+
+    def search_method(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def ordering_method(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
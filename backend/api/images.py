@@ -0,0 +1,155 @@
+'''Обработка картинок рецептов.
+
+Картинка из base64 декодируется частями с ограничением размера и
+сохраняется под именем из хэша содержимого, поэтому одинаковые
+загрузки не дублируются на диске. Уменьшенная копия и WebP-варианты
+строятся в фоновом пуле потоков после сохранения рецепта.'''
+import binascii
+import hashlib
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image
+
+from api.cache import bump_generation
+from api.connections import close_unusable_connections
+from api.constants import (BASE64_CHUNK_SIZE, IMAGE_THUMBNAIL_SIZE,
+                           IMAGE_WEBP_QUALITY)
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIRECTORY = 'recipes/images'
+THUMBNAIL_SUFFIX = '_thumb.webp'
+WEBP_SUFFIX = '.webp'
+
+executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS,
+                              thread_name_prefix='images')
+pending = set()
+pending_lock = threading.Lock()
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def decode_base64(data, max_size):
+    '''Декодирует base64 частями, не превышая max_size байт.
+    Возвращает содержимое и его sha256.'''
+    # Переносы строк и пробелы убираются заранее: иначе граница части
+    # может разрезать четверку символов base64
+    data = ''.join(data.split())
+    if len(data) * 3 // 4 > max_size + 2:
+        raise ImageTooLarge
+    buffer = io.BytesIO()
+    digest = hashlib.sha256()
+    for start in range(0, len(data), BASE64_CHUNK_SIZE):
+        chunk = binascii.a2b_base64(
+            data[start:start + BASE64_CHUNK_SIZE].encode('ascii'))
+        if buffer.tell() + len(chunk) > max_size:
+            raise ImageTooLarge
+        buffer.write(chunk)
+        digest.update(chunk)
+    return buffer.getvalue(), digest.hexdigest()
+
+
+def content_file(data, ext):
+    '''Файл с именем по хэшу содержимого; если такой файл уже
+    сохранен, возвращается его имя'''
+    content, digest = decode_base64(data, settings.MAX_IMAGE_SIZE)
+    name = posixpath.join(IMAGE_DIRECTORY, f'{digest[:32]}.{ext}')
+    if default_storage.exists(name):
+        return name, content
+    return ContentFile(content, name=name), content
+
+
+def variant_names(name):
+    base = posixpath.splitext(name)[0]
+    return base + THUMBNAIL_SUFFIX, base + WEBP_SUFFIX
+
+
+def variant_url(name, variants_name, index):
+    '''URL варианта картинки или оригинала, пока варианты не готовы.
+    Готовность берется из рецепта (variants_name), хранилище не
+    опрашивается.'''
+    if not name:
+        return None
+    if variants_name == name:
+        return default_storage.url(variant_names(name)[index])
+    return default_storage.url(name)
+
+
+def mark_ready(name):
+    '''Отмечает варианты готовыми у всех рецептов с этой картинкой'''
+    if Recipe.objects.filter(image=name).exclude(
+            image_variants=name).update(image_variants=name):
+        bump_generation('recipes.recipe')
+
+
+def generate_variants(name):
+    thumbnail_name, webp_name = variant_names(name)
+    if (default_storage.exists(thumbnail_name)
+            and default_storage.exists(webp_name)):
+        mark_ready(name)
+        return
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    for variant_name, size in ((webp_name, None),
+                               (thumbnail_name, IMAGE_THUMBNAIL_SIZE)):
+        if default_storage.exists(variant_name):
+            continue
+        variant = image.copy()
+        if size:
+            variant.thumbnail(size)
+        output = io.BytesIO()
+        variant.save(output, 'WEBP', quality=IMAGE_WEBP_QUALITY)
+        default_storage.save(variant_name, ContentFile(output.getvalue()))
+    mark_ready(name)
+
+
+def safe_generate_variants(name):
+    try:
+        generate_variants(name)
+    except Exception:
+        logger.exception('Не удалось построить варианты %s', name)
+    finally:
+        with pending_lock:
+            pending.discard(name)
+
+
+def generate_in_worker(name):
+    '''Задача фонового пула. Потоки пула живут долго, поэтому их
+    соединения с базой закрываются по тем же правилам, что и в конце
+    обычного запроса: иначе соединение, закрытое сервером или пулером,
+    ломало бы все следующие задачи потока.'''
+    close_old_connections()
+    close_unusable_connections()
+    try:
+        safe_generate_variants(name)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(name):
+    '''Ставит построение вариантов в очередь; повторная загрузка той же
+    картинки, пока она в работе, новую задачу не создает'''
+    if not name:
+        return
+    with pending_lock:
+        if name in pending:
+            return
+        pending.add(name)
+    if settings.IMAGE_VARIANTS_ASYNC:
+        executor.submit(generate_in_worker, name)
+    else:
+        safe_generate_variants(name)
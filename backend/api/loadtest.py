@@ -0,0 +1,226 @@
+import http.client
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import quote, urlsplit
+
+from rest_framework.authtoken.models import Token
+
+from api.profiling import quantile
+from api.seed import seed_users
+from recipes.models import Favorite, Recipe
+from users.models import Follow
+
+# Смеси запросов нагрузочного теста: (операция, вес). Операции
+# добавления в избранное и подписки сразу отменяются, чтобы данные
+# не менялись от прогона к прогону. read - только чтение рецептов и
+# справочников, которое под ASGI идет через асинхронные view.
+WORKLOADS = {
+    'mixed': (
+        ('recipes-list', 25),
+        ('recipes-list-anonymous', 10),
+        ('recipes-filter', 15),
+        ('recipes-detail', 20),
+        ('users-subscriptions', 5),
+        ('subscribe', 5),
+        ('favorite', 15),
+        ('download-shopping-cart', 5),
+    ),
+    'read': (
+        ('recipes-list', 30),
+        ('recipes-list-anonymous', 10),
+        ('recipes-filter', 20),
+        ('recipes-detail', 25),
+        ('tags', 5),
+        ('ingredients-search', 10),
+    ),
+}
+INGREDIENT_PREFIXES = ('ка', 'мо', 'са', 'пе', 'ма', 'со')
+CANDIDATES = 200
+PAGES = 10
+
+
+class Client:
+    '''Пользователь нагрузочного теста: токен и рецепты/авторы, которых
+    нет у него в избранном и подписках'''
+
+    def __init__(self, user, recipe_ids, author_ids, rnd):
+        self.token = Token.objects.get_or_create(user=user)[0].key
+        favorites = set(Favorite.objects.filter(user=user).values_list(
+            'recipe_id', flat=True))
+        follows = set(Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True))
+        self.recipe_ids = recipe_ids
+        self.new_recipes = [recipe_id for recipe_id in rnd.sample(
+            recipe_ids, min(CANDIDATES, len(recipe_ids)))
+            if recipe_id not in favorites]
+        self.new_authors = [author_id for author_id in rnd.sample(
+            author_ids, min(CANDIDATES, len(author_ids)))
+            if author_id not in follows and author_id != user.id]
+
+
+def prepare_clients(count, seed=0):
+    rnd = random.Random(seed)
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    author_ids = list(seed_users().values_list('id', flat=True))
+    users = list(seed_users().order_by('id')[:count])
+    if not users or not recipe_ids:
+        raise ValueError('Нет сгенерированных данных')
+    return [Client(user, recipe_ids, author_ids, rnd) for user in users]
+
+
+class Worker(threading.Thread):
+    '''Поток, который выполняет операции смеси workload до дедлайна
+    через одно keep-alive соединение'''
+
+    def __init__(self, url, client, deadline, seed, workload):
+        super().__init__(daemon=True)
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.client = client
+        self.deadline = deadline
+        self.workload = workload
+        self.rnd = random.Random(seed)
+        self.connection = None
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def request(self, name, method, path, auth=True):
+        headers = ({'Authorization': f'Token {self.client.token}'}
+                   if auth else {})
+        started = time.perf_counter()
+        status = None
+        # Повтор только если сервер закрыл keep-alive соединение
+        for _ in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(
+                    self.host, self.port, timeout=30)
+            try:
+                self.connection.request(method, self.prefix + path,
+                                        headers=headers)
+                response = self.connection.getresponse()
+                response.read()
+                status = response.status
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError,
+                    ConnectionResetError):
+                self.connection.close()
+            except (OSError, http.client.HTTPException):
+                self.connection.close()
+                break
+        self.samples[name].append(time.perf_counter() - started)
+        if status is None or status >= 400:
+            self.errors[name] += 1
+
+    def run(self):
+        operations, weights = zip(*self.workload)
+        while time.perf_counter() < self.deadline:
+            name = self.rnd.choices(operations, weights)[0]
+            getattr(self, name.replace('-', '_'))()
+
+    def recipes_list(self):
+        page = self.rnd.randint(1, PAGES)
+        self.request('recipes-list', 'GET', f'/recipes/?page={page}')
+
+    def recipes_list_anonymous(self):
+        page = self.rnd.randint(1, PAGES)
+        self.request('recipes-list-anonymous', 'GET',
+                     f'/recipes/?page={page}', auth=False)
+
+    def recipes_filter(self):
+        self.request('recipes-filter', 'GET',
+                     '/recipes/?tags=lunch&tags=dinner&is_favorited=1')
+
+    def recipes_detail(self):
+        recipe_id = self.rnd.choice(self.client.recipe_ids)
+        self.request('recipes-detail', 'GET', f'/recipes/{recipe_id}/')
+
+    def tags(self):
+        self.request('tags', 'GET', '/tags/')
+
+    def ingredients_search(self):
+        prefix = quote(self.rnd.choice(INGREDIENT_PREFIXES))
+        self.request('ingredients-search', 'GET',
+                     f'/ingredients/?name={prefix}')
+
+    def users_subscriptions(self):
+        self.request('users-subscriptions', 'GET',
+                     '/users/subscriptions/?recipes_limit=3')
+
+    def subscribe(self):
+        if not self.client.new_authors:
+            return
+        author_id = self.rnd.choice(self.client.new_authors)
+        path = f'/users/{author_id}/subscribe/'
+        self.request('subscribe', 'POST', path)
+        self.request('unsubscribe', 'DELETE', path)
+
+    def favorite(self):
+        if not self.client.new_recipes:
+            return
+        recipe_id = self.rnd.choice(self.client.new_recipes)
+        path = f'/recipes/{recipe_id}/favorite/'
+        self.request('favorite', 'POST', path)
+        self.request('unfavorite', 'DELETE', path)
+
+    def download_shopping_cart(self):
+        self.request('download-shopping-cart', 'GET',
+                     '/recipes/download_shopping_cart/')
+
+
+def run(url, clients, concurrency, duration, seed=0, workload='mixed'):
+    '''Запускает concurrency потоков на duration секунд и возвращает
+    задержки и ошибки по операциям. Потоков должно быть не больше
+    клиентов, иначе их операции пересекаются.'''
+    deadline = time.perf_counter() + duration
+    workers = [Worker(url, clients[i % len(clients)], deadline, seed + i,
+                      WORKLOADS[workload])
+               for i in range(concurrency)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    samples, errors = defaultdict(list), defaultdict(int)
+    for worker in workers:
+        for name, values in worker.samples.items():
+            samples[name].extend(values)
+        for name, count in worker.errors.items():
+            errors[name] += count
+    return summarize(samples, errors, elapsed)
+
+
+def summarize(samples, errors, elapsed):
+    samples['total'] = [value for values in list(samples.values())
+                        for value in values]
+    errors['total'] = sum(errors.values())
+    report = {}
+    for name, values in samples.items():
+        values.sort()
+        report[name] = {
+            'requests': len(values),
+            'errors': errors[name],
+            'rps': round(len(values) / elapsed, 1),
+            **{f'p{round(q * 100)}': round(quantile(values, q) * 1000, 1)
+               for q in (0.5, 0.95, 0.99)},
+        }
+    return report
+
+
+def compare(report, baseline, max_regression):
+    '''Операции, у которых p95 вырос больше чем на max_regression (доля)
+    относительно baseline; для total проверяется и общий req/s'''
+    regressions = []
+    for name, current in report.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        slower = current['p95'] > previous['p95'] * (1 + max_regression)
+        fewer = (name == 'total'
+                 and current['rps'] < previous['rps'] * (1 - max_regression))
+        if slower or fewer:
+            regressions.append(name)
+    return regressions
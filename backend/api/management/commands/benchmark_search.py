@@ -0,0 +1,78 @@
+import random
+import re
+import statistics
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from api.search import search_recipes
+from api.seed import seed_dataset
+from recipes.models import Ingredient, Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сравнение полнотекстового поиска рецептов с ILIKE по '
+            'названию, описанию и ингредиентам (данные откатываются)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--limit', type=int, default=6)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Нужна база PostgreSQL')
+        with transaction.atomic():
+            seed_dataset(users=options['users'], recipes=options['recipes'],
+                         follows=5, favorites=5)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            terms = self.pick_terms(options['queries'])
+            for name, build in (('ilike', self.ilike),
+                                ('tsvector', self.full_text)):
+                self.report(name, build, terms, options)
+            transaction.set_rollback(True)
+
+    def pick_terms(self, count):
+        names = list(Ingredient.objects.filter(
+            recipes__isnull=False).values_list('name', flat=True)[:1000])
+        words = sorted({word for name in names for word in name.split()
+                        if len(word) > 3})
+        return random.Random(0).sample(words, min(count, len(words)))
+
+    @staticmethod
+    def ilike(term):
+        return Recipe.objects.filter(
+            Q(name__icontains=term) | Q(text__icontains=term)
+            | Q(ingredients__name__icontains=term),
+        ).distinct().order_by('-pub_date', '-id')
+
+    @staticmethod
+    def full_text(term):
+        return search_recipes(Recipe.objects.all(), term)
+
+    def report(self, name, build, terms, options):
+        timings = []
+        found = 0
+        for term in terms:
+            queryset = build(term)[:options['limit']]
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                rows = list(queryset.values_list('id', flat=True))
+                timings.append((time.perf_counter() - started) * 1000)
+            found += len(rows)
+        timings.sort()
+        sql, params = build(terms[0])[:1].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            plan = ' '.join(row[0] for row in cursor.fetchall())
+        scanned = sorted(set(re.findall(r'Seq Scan on (\w+)', plan)))
+        self.stdout.write(
+            f'{name}: p50 {statistics.median(timings):.2f} мс, '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f} мс, '
+            f'найдено {found}, последовательное сканирование: '
+            f'{", ".join(scanned) or "нет"}')
@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand
+from django.db.models import F
+
+from api import images
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Строит уменьшенные копии и WebP-варианты для картинок '
+            'уже сохраненных рецептов')
+
+    def handle(self, *args, **options):
+        names = (Recipe.objects.exclude(image='')
+                 .exclude(image_variants=F('image'))
+                 .values_list('image', flat=True).distinct())
+        built = failed = 0
+        for name in names.iterator():
+            try:
+                images.generate_variants(name)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+            else:
+                built += 1
+        self.stdout.write(f'Обработано картинок: {built}, ошибок: {failed}')
@@ -0,0 +1,55 @@
+import json
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from api.bulk import import_recipes, parse_lines
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Загрузка рецептов из JSON lines: по рецепту на строку, '
+            'ошибочные записи пропускаются с сообщением')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSON lines или - для stdin')
+        parser.add_argument('--author',
+                            help='Username автора всех рецептов; без него '
+                                 'автор берется из поля author записи')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        author = None
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(
+                    f'Пользователь {options["author"]} не найден')
+        started = time.monotonic()
+        if options['path'] == '-':
+            created, failed = self.load(sys.stdin, author, options)
+        else:
+            try:
+                file = open(options['path'], encoding='utf-8')
+            except OSError as error:
+                raise CommandError(error)
+            with file:
+                created, failed = self.load(file, author, options)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано рецептов: {created}, с ошибками: {failed}, '
+            f'время: {time.monotonic() - started:.2f} с'))
+
+    def load(self, lines, author, options):
+        created = failed = 0
+        for result in import_recipes(parse_lines(lines),
+                                     options['chunk_size'], author=author):
+            if 'id' in result:
+                created += 1
+                continue
+            failed += 1
+            self.stderr.write(f'строка {result["line"]}: ' + json.dumps(
+                result['errors'], ensure_ascii=False))
+        return created, failed
@@ -0,0 +1,102 @@
+import json
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from api import loadtest
+from api.seed import seed_users
+from recipes.models import Recipe
+
+BASELINE_PATH = settings.BASE_DIR / 'benchmarks' / 'baseline.json'
+COLUMNS = ('requests', 'errors', 'rps', 'p50', 'p95', 'p99')
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест API запущенного сервера (runserver, '
+            'gunicorn) на данных seed_data: задержки p50/p95/p99 в мс и '
+            'req/s по операциям, сравнение с сохраненным baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument('--users', type=int, default=50,
+                            help='сколько сгенерированных пользователей '
+                                 'выполняют запросы')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workload', default='mixed',
+                            choices=sorted(loadtest.WORKLOADS),
+                            help='смесь запросов: mixed - чтение и '
+                                 'запись, read - только чтение')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH))
+        parser.add_argument('--save-baseline', action='store_true')
+        parser.add_argument('--label', default='',
+                            help='описание стенда, сохраняется в baseline')
+        parser.add_argument('--max-regression', type=float, default=0.2,
+                            help='допустимый рост p95 и падение req/s '
+                                 '(доля)')
+
+    def handle(self, *args, **options):
+        try:
+            clients = loadtest.prepare_clients(
+                max(options['users'], options['concurrency']),
+                options['seed'])
+        except ValueError as error:
+            raise CommandError(f'{error}, выполните seed_data')
+        report = loadtest.run(options['url'], clients,
+                              options['concurrency'], options['duration'],
+                              options['seed'], options['workload'])
+        baseline = self.load_baseline(options['baseline'],
+                                      options['workload'])
+        self.print_report(report, baseline)
+        if report['total']['errors']:
+            raise CommandError(
+                f'Ошибок: {report["total"]["errors"]}')
+        if options['save_baseline']:
+            self.save_baseline(options, report)
+        elif baseline:
+            regressions = loadtest.compare(report, baseline,
+                                           options['max_regression'])
+            if regressions:
+                raise CommandError('Хуже baseline: '
+                                   + ', '.join(regressions))
+
+    def load_baseline(self, path, workload):
+        '''Отчет baseline, записанного с той же смесью запросов'''
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return {}
+        if data['options'].get('workload', 'mixed') != workload:
+            return {}
+        return data['report']
+
+    def save_baseline(self, options, report):
+        data = {
+            'created': datetime.now(timezone.utc).isoformat(
+                timespec='seconds'),
+            'options': {name: options[name] for name in (
+                'url', 'concurrency', 'duration', 'users', 'seed',
+                'workload', 'label')},
+            'dataset': {'users': seed_users().count(),
+                        'recipes': Recipe.objects.count()},
+            'report': report,
+        }
+        with open(options['baseline'], 'w', encoding='utf-8') as file:
+            json.dump(data, file, indent=2, ensure_ascii=False)
+            file.write('\n')
+        self.stdout.write(f'Baseline сохранен в {options["baseline"]}')
+
+    def print_report(self, report, baseline):
+        self.stdout.write(f'{"операция":<24}' + ''.join(
+            f'{column:>10}' for column in COLUMNS)
+            + ('  p95 baseline' if baseline else ''))
+        for name in sorted(report, key=lambda name: (name == 'total', name)):
+            row = report[name]
+            line = f'{name:<24}' + ''.join(
+                f'{row[column]:>10}' for column in COLUMNS)
+            if name in baseline:
+                line += f'  {baseline[name]["p95"]:>12}'
+            self.stdout.write(line)
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from api import feed
+
+
+class Command(BaseCommand):
+    help = ('Заводит готовые ленты пользователям с большим числом '
+            'подписок и удаляет ленты тех, у кого подписок стало мало')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-follows', type=int,
+                            default=settings.FEED_MATERIALIZE_FOLLOWS,
+                            help='Подписок, начиная с которых лента '
+                                 'хранится готовой')
+        parser.add_argument('--refresh', action='store_true',
+                            help='Дописать пропущенные записи в уже '
+                                 'готовые ленты')
+
+    def handle(self, *args, **options):
+        min_follows = options['min_follows']
+        with transaction.atomic():
+            # Половина порога: пользователь, который отписался от
+            # нескольких авторов, не теряет ленту сразу
+            dropped = feed.drop(min_follows // 2)
+            added = feed.materialize(min_follows)
+            if options['refresh']:
+                added += feed.refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено лент: {dropped}, добавлено записей: {added}'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management import BaseCommand
+
+from api.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики избранного, списков покупок и '
+            'рецептов авторов и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Пауза между пачками, секунды')
+
+    def handle(self, *args, **options):
+        fixed = {'recipes': 0, 'authors': 0}
+        for name, first_id, last_id, count in reconcile(
+                options['batch_size']):
+            fixed[name] += count
+            if count:
+                self.stdout.write(
+                    f'{name} {first_id}-{last_id - 1}: исправлено {count}')
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            'Исправлено строк: ' + ', '.join(
+                f'{name} {count}' for name, count in fixed.items())))
@@ -0,0 +1,36 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from api.seed import clear_dataset, seed_dataset, seed_users
+
+
+class Command(BaseCommand):
+    help = ('Наполнение базы сгенерированными пользователями, подписками, '
+            'рецептами, избранным и списками покупок для нагрузочных '
+            'тестов (данные сохраняются)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=20)
+        parser.add_argument('--favorites', type=int, default=30)
+        parser.add_argument('--carts', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true',
+                            help='только удалить сгенерированные данные')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted, _ = clear_dataset()
+            self.stdout.write(f'Удалено объектов: {deleted}')
+            return
+        if seed_users().exists():
+            raise CommandError('Сгенерированные данные уже есть, '
+                               'используйте --clear')
+        with transaction.atomic():
+            seed_dataset(users=options['users'], recipes=options['recipes'],
+                         follows=options['follows'],
+                         favorites=options['favorites'],
+                         carts=options['carts'], seed=options['seed'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {seed_users().count()}'))
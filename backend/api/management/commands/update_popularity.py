@@ -0,0 +1,37 @@
+import datetime
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from api import popularity
+from api.counters import id_ranges
+from recipes.loaders import batches
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает популярность рецептов с активностью за '
+            'последние --window минут или, с --full, всех рецептов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, default=60,
+                            help='Окно активности, минуты')
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать все рецепты, в том числе '
+                                 'после удалений из избранного')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = 0
+        if options['full']:
+            for first_id, last_id in id_ranges(Recipe,
+                                               options['batch_size']):
+                updated += popularity.update_range(first_id, last_id)
+        else:
+            since = timezone.now() - datetime.timedelta(
+                minutes=options['window'])
+            for ids in batches(popularity.touched_since(since),
+                               options['batch_size']):
+                updated += popularity.update_ids(ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлена популярность рецептов: {updated}'))
@@ -0,0 +1,39 @@
+'''Подбор рецептов по имеющимся продуктам.
+
+В recipes_recipe.ingredient_ids хранится отсортированный массив id
+ингредиентов рецепта под GIN-индексом. Кандидаты отбираются по
+пересечению массивов (оператор &&, индекс), а число совпавших и
+недостающих ингредиентов считается в том же запросе по массиву самой
+строки, без чтения IngredientRecipe.'''
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import BigIntegerField, F, Func, IntegerField
+from django.db.models.expressions import RawSQL
+
+MATCH_ORDERING = ('missing_count', '-matched_count', '-id')
+
+MATCHED_SQL = '''
+SELECT COUNT(*) FROM unnest(recipes_recipe.ingredient_ids) AS item
+WHERE item = ANY(%s)
+'''
+MISSING_SQL = '''
+ARRAY(SELECT item FROM unnest(recipes_recipe.ingredient_ids) AS item
+      WHERE item <> ALL(%s))
+'''
+
+
+def match_recipes(queryset, ingredient_ids):
+    '''Рецепты, в которых есть хотя бы один из ingredient_ids, с
+    matched_count, missing_count и missing_ingredients; сначала те,
+    для которых не хватает меньше всего продуктов'''
+    ids = sorted(set(ingredient_ids))
+    return queryset.filter(ingredient_ids__overlap=ids).annotate(
+        matched_count=RawSQL(MATCHED_SQL, (ids,),
+                             output_field=IntegerField()),
+        missing_ingredients=RawSQL(
+            MISSING_SQL, (ids,),
+            output_field=ArrayField(BigIntegerField())),
+    ).annotate(
+        missing_count=Func(F('ingredient_ids'), function='cardinality',
+                           output_field=IntegerField())
+        - F('matched_count'),
+    ).order_by(*MATCH_ORDERING)
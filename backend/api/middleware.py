@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import InterfaceError, OperationalError
+from rest_framework.permissions import SAFE_METHODS
+
+from api.profiling import QueryProfile, metrics
+from api.replicas import PRIMARY, current_reads, reads, replica_set
+
+UNRESOLVED = 'unresolved'
+# Метод приходит от клиента: остальные методы собираются под OTHER,
+# чтобы произвольные методы не плодили ключи метрик
+PROFILED_METHODS = frozenset(
+    ('GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'))
+OTHER_METHOD = 'OTHER'
+PIN_COOKIE = 'primary_reads'
+PIN_KEY = 'replica-pin:{}'
+
+
+class QueryProfilingMiddleware:
+    '''Замеряет время ответа, число и время SQL-запросов, повторные
+    запросы; отдает их в заголовке Server-Timing и копит в метриках
+    по view. Включается настройкой QUERY_PROFILING.
+
+    Под ASGI запросы к базе выполняются не в потоке middleware, поэтому
+    профиль передается в request.query_profile и его подключают view с
+    AsyncReadMixin; у остальных view учитывается только время.'''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        profile = QueryProfile()
+        start = time.perf_counter()
+        with profile.enable():
+            response = self.get_response(request)
+        return self.finish(request, response, profile, start)
+
+    async def __acall__(self, request):
+        profile = request.query_profile = QueryProfile()
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        return self.finish(request, response, profile, start)
+
+    def finish(self, request, response, profile, start):
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else UNRESOLVED
+        method = (request.method if request.method in PROFILED_METHODS
+                  else OTHER_METHOD)
+        metrics.record((method, view), duration, profile)
+        response['Server-Timing'] = profile.server_timing(duration)
+        return response
+
+
+class ReplicaMiddleware:
+    '''Разрешает чтение с реплик безопасным запросам. После успешного
+    изменения клиент REPLICA_PIN_SECONDS читает с основной базы и
+    видит свою запись, даже если реплики отстают: браузер - по cookie,
+    остальные клиенты - по ключу в кэше от заголовка Authorization.
+    Ключ в кэше процесса другие воркеры не видят, поэтому без общего
+    кэша (CACHE_SHARED) клиенты с Authorization и без cookie всегда
+    читают с основной базы. Включается, если заданы реплики
+    (DB_REPLICAS).'''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with reads(self.use_replicas(request)):
+            response = self.get_response(request)
+        self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        use_replicas = await sync_to_async(
+            self.use_replicas, thread_sensitive=False)(request)
+        with reads(use_replicas):
+            response = await self.get_response(request)
+        await sync_to_async(self.pin, thread_sensitive=False)(
+            request, response)
+        return response
+
+    @staticmethod
+    def pin_key(authorization):
+        '''Ключ закрепления клиента с заголовком Authorization'''
+        if not authorization:
+            return None
+        return PIN_KEY.format(
+            hashlib.md5(authorization.encode()).hexdigest())
+
+    def use_replicas(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        if PIN_COOKIE in request.COOKIES:
+            return False
+        key = self.pin_key(request.headers.get('Authorization'))
+        if key is None:
+            return True
+        return settings.CACHE_SHARED and cache.get(key) is None
+
+    def pin(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return
+        response.set_cookie(PIN_COOKIE, '1',
+                            max_age=settings.REPLICA_PIN_SECONDS,
+                            httponly=True, samesite='Lax')
+        key = self.pin_key(request.headers.get('Authorization'))
+        if key is not None and settings.CACHE_SHARED:
+            cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+
+    def process_exception(self, request, exception):
+        '''Реплика, на которой запрос упал из-за соединения, временно
+        исключается из круга'''
+        state = current_reads.get()
+        if (isinstance(exception, (OperationalError, InterfaceError))
+                and state is not None
+                and state.alias not in (None, PRIMARY)):
+            replica_set.mark_down(state.alias)
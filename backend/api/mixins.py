@@ -1,6 +1,17 @@
 import re
+from contextlib import nullcontext
+from functools import update_wrapper
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
 from rest_framework import serializers
+from rest_framework.response import Response
+
+from api.cache import count, get_generations, make_key
+from api.connections import close_unusable_connections
+from api.replicas import use_primary
 
 
 class UsernameValidationMixin:
@@ -15,3 +26,92 @@ class UsernameValidationMixin:
                 'digits and @/./+/- only.'
             )
         return value
+
+
+class AnonymousCacheMixin:
+    '''Кэширует ответы list/retrieve для анонимных пользователей.
+    Ключ строится из поколений моделей cache_models и нормализованных
+    параметров запроса, поэтому любое изменение этих моделей делает
+    старые записи недостижимыми.'''
+    cache_prefix = None
+    cache_models = ()
+
+    def get_cache_key(self, request):
+        params = sorted((key, sorted(request.query_params.getlist(key)))
+                        for key in request.query_params)
+        generations = get_generations(
+            *(model._meta.label_lower for model in self.cache_models))
+        return make_key(self.cache_prefix, generations,
+                        request.get_host(), request.path, params)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            count('hit')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        count('miss')
+        # Ответ хранится до следующего изменения моделей, поэтому он
+        # строится по основной базе, а не по отстающей реплике
+        with use_primary():
+            response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request,
+                                    *args, **kwargs)
+
+
+def call_in_thread(view, request, *args, **kwargs):
+    '''Выполняет синхронный view и там же рендерит ответ. Соединения
+    с базой в этом потоке закрываются по тем же правилам, что и в
+    конце обычного запроса.'''
+    close_old_connections()
+    close_unusable_connections()
+    profile = getattr(request, 'query_profile', None)
+    try:
+        with profile.enable() if profile else nullcontext():
+            response = view(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)):
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+class AsyncReadMixin:
+    '''При ASYNC_VIEWS (по умолчанию под foodgram.asgi) действия
+    async_actions отдаются асинхронным view: запрос к базе и рендеринг
+    выполняются в пуле потоков, и медленный запрос не занимает поток,
+    общий для всех синхронных view процесса. Остальные методы
+    выполняются как обычные синхронные view.'''
+    async_actions = ('list', 'retrieve')
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        methods = {method for method, action in actions.items()
+                   if action in cls.async_actions}
+        if not settings.ASYNC_VIEWS or not methods:
+            return view
+        if 'get' in methods:
+            methods.add('head')
+        sync_view = sync_to_async(call_in_thread, thread_sensitive=True)
+        read_view = sync_to_async(call_in_thread, thread_sensitive=False)
+
+        async def async_view(request, *args, **kwargs):
+            handler = (read_view if request.method.lower() in methods
+                       else sync_view)
+            return await handler(view, request, *args, **kwargs)
+
+        return update_wrapper(async_view, view)
@@ -0,0 +1,12 @@
+from rest_framework.parsers import BaseParser
+
+
+class JSONLinesParser(BaseParser):
+    '''JSON lines: по объекту на строку. Тело не читается целиком,
+    возвращается итератор строк; разбор строк - api.bulk.parse_lines.'''
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        return iter(stream)
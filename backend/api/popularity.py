@@ -0,0 +1,89 @@
+'''Популярность рецептов.
+
+Каждое добавление в избранное или в список покупок дает вклад
+weight * 2 ** (-возраст / период полураспада). Чтобы не пересчитывать
+все рецепты по мере старения событий, вклад отсчитывается вперед от
+фиксированной эпохи: 2 ** ((время события - EPOCH) / период). Общий
+множитель 2 ** (-(сейчас - EPOCH) / период) одинаков для всех рецептов
+и на порядок не влияет, поэтому пересчитывать нужно только рецепты с
+новой активностью. В колонке хранится логарифм суммы (log-sum-exp),
+чтобы значения не переполнялись; у рецептов без активности - 0.'''
+import datetime
+import math
+
+from django.db import connection
+
+from api.cache import bump_generation
+from api.constants import (POPULARITY_CART_WEIGHT, POPULARITY_FAVORITE_WEIGHT,
+                           POPULARITY_HALF_LIFE_DAYS)
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+EPOCH = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+EVENT_SQL = '''
+SELECT recipe_id, {log_weight} + {rate} * EXTRACT(
+    EPOCH FROM pub_date - %(epoch)s)::float8 AS x
+FROM {table} WHERE recipe_id IN (SELECT id FROM batch)
+'''
+
+UPDATE_SQL = '''
+WITH batch AS (
+    SELECT id FROM {recipes} WHERE {condition}
+), events AS (
+    {events}
+), peaks AS (
+    SELECT recipe_id, x, MAX(x) OVER (PARTITION BY recipe_id) AS peak
+    FROM events
+), scores AS (
+    SELECT recipe_id, peak + LN(SUM(EXP(x - peak))) AS score
+    FROM peaks GROUP BY recipe_id, peak
+)
+UPDATE {recipes} AS recipe SET popularity = COALESCE(scores.score, 0)
+FROM batch LEFT JOIN scores ON scores.recipe_id = batch.id
+WHERE recipe.id = batch.id
+  AND recipe.popularity IS DISTINCT FROM COALESCE(scores.score, 0)
+'''
+
+WEIGHTS = (
+    (Favorite, POPULARITY_FAVORITE_WEIGHT),
+    (ShoppingCart, POPULARITY_CART_WEIGHT),
+)
+
+
+def build_sql(condition):
+    rate = math.log(2) / (POPULARITY_HALF_LIFE_DAYS * 24 * 60 * 60)
+    events = '\nUNION ALL\n'.join(
+        EVENT_SQL.format(table=model._meta.db_table,
+                         log_weight=repr(math.log(weight)), rate=repr(rate))
+        for model, weight in WEIGHTS)
+    return UPDATE_SQL.format(recipes=Recipe._meta.db_table,
+                             condition=condition, events=events)
+
+
+def update_range(first_id, last_id):
+    '''Пересчитывает рецепты с id в [first_id, last_id)'''
+    return execute('id >= %(first)s AND id < %(last)s',
+                   {'first': first_id, 'last': last_id})
+
+
+def update_ids(ids):
+    return execute('id = ANY(%(ids)s)', {'ids': list(ids)})
+
+
+def touched_since(since):
+    '''id рецептов, которые добавляли в избранное или список покупок
+    начиная с since'''
+    ids = set()
+    for model, _ in WEIGHTS:
+        ids.update(model.objects.filter(pub_date__gte=since).values_list(
+            'recipe_id', flat=True).distinct())
+    return sorted(ids)
+
+
+def execute(condition, params):
+    with connection.cursor() as cursor:
+        cursor.execute(build_sql(condition), {'epoch': EPOCH, **params})
+        updated = cursor.rowcount
+    if updated:
+        bump_generation('recipes.recipe')
+    return updated
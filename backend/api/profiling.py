@@ -0,0 +1,165 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+QUANTILES = (0.5, 0.95, 0.99)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+TOP_DUPLICATES = 5
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PROMETHEUS_METRICS = (
+    ('duration', 'foodgram_request_duration_seconds',
+     'Время обработки запроса'),
+    ('queries', 'foodgram_request_queries', 'SQL-запросов на запрос'),
+    ('sql_time', 'foodgram_request_sql_seconds',
+     'Время SQL-запросов на запрос'),
+    ('duplicates', 'foodgram_request_duplicate_queries',
+     'Повторных SQL-запросов на запрос'),
+)
+
+
+def fingerprint(sql):
+    '''Текст запроса без литералов: запросы, которые отличаются только
+    значениями (типичный N+1), получают один отпечаток'''
+    return LITERALS.sub('?', ' '.join(sql.split()))
+
+
+def quantile(values, q):
+    '''Квантиль отсортированного списка методом ближайшего ранга'''
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+class QueryProfile:
+    '''SQL-запросы одного HTTP-запроса на всех подключениях'''
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def enable(self):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    @property
+    def duplicates(self):
+        return [sql for sql, count in self.fingerprints.items() if count > 1]
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.fingerprints.values())
+
+    def server_timing(self, duration):
+        return (f'total;dur={duration * 1000:.1f}, '
+                f'sql;dur={self.duration * 1000:.1f};'
+                f'desc="{self.count} queries", '
+                f'dup;desc="{self.duplicate_count} duplicate queries"')
+
+
+class Metrics:
+    '''Скользящее окно последних замеров каждого view в памяти процесса.
+    Квантили и гистограмма считаются по окну, суммы - с запуска.'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(
+            lambda: deque(maxlen=settings.QUERY_PROFILING_WINDOW))
+        self.totals = defaultdict(Counter)
+        self.duplicates = defaultdict(Counter)
+
+    def record(self, key, duration, profile):
+        sample = {
+            'duration': duration,
+            'queries': profile.count,
+            'sql_time': profile.duration,
+            'duplicates': profile.duplicate_count,
+        }
+        with self.lock:
+            self.samples[key].append(sample)
+            self.totals[key].update(sample, requests=1)
+            duplicates = self.duplicates[key]
+            duplicates.update(profile.duplicates)
+            if len(duplicates) > TOP_DUPLICATES * 10:
+                self.duplicates[key] = Counter(
+                    dict(duplicates.most_common(TOP_DUPLICATES)))
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.totals.clear()
+            self.duplicates.clear()
+
+    def report(self):
+        '''Сводка по view, самые медленные (по p95) - первыми'''
+        with self.lock:
+            snapshot = [(key, list(samples), dict(self.totals[key]),
+                         self.duplicates[key].most_common(TOP_DUPLICATES))
+                        for key, samples in self.samples.items()]
+        report = [self.summarize(key, *data) for key, *data in snapshot]
+        return sorted(report, key=lambda view: -view['duration']['p95'])
+
+    @staticmethod
+    def summarize(key, samples, totals, duplicates):
+        method, view = key
+        summary = {'method': method, 'view': view, 'window': len(samples),
+                   'totals': totals}
+        for name, _, _ in PROMETHEUS_METRICS:
+            values = sorted(sample[name] for sample in samples)
+            summary[name] = {
+                **{f'p{round(q * 100)}': quantile(values, q)
+                   for q in QUANTILES},
+                'avg': sum(values) / len(values),
+                'max': values[-1],
+            }
+        summary['histogram'] = {
+            str(bound): sum(sample['duration'] <= bound for sample in samples)
+            for bound in DURATION_BUCKETS}
+        summary['histogram']['+Inf'] = len(samples)
+        summary['top_duplicates'] = [
+            {'sql': sql, 'requests': requests}
+            for sql, requests in duplicates]
+        return summary
+
+
+def escape(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def to_prometheus(report):
+    '''Сводка в текстовом формате Prometheus: summary с квантилями
+    по окну и суммами с запуска процесса'''
+    lines = []
+    for name, metric, description in PROMETHEUS_METRICS:
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} summary')
+        for view in report:
+            labels = (f'method="{escape(view["method"])}",'
+                      f'view="{escape(view["view"])}"')
+            for q in QUANTILES:
+                value = view[name][f'p{round(q * 100)}']
+                lines.append(f'{metric}{{{labels},quantile="{q}"}} {value}')
+            lines.append(f'{metric}_sum{{{labels}}} '
+                         f'{view["totals"].get(name, 0)}')
+            lines.append(f'{metric}_count{{{labels}}} '
+                         f'{view["totals"]["requests"]}')
+    return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
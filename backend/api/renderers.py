@@ -0,0 +1,35 @@
+import json
+
+from rest_framework import renderers
+
+
+class PassthroughRenderer(renderers.BaseRenderer):
+    '''Рендерер для ответов, которые view формирует сам
+    (StreamingHttpResponse). Нужен, чтобы ?format= проходил
+    согласование контента DRF. Ошибки отдаются как JSON-строка.'''
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (str, bytes)):
+            return data
+        return json.dumps(data, ensure_ascii=False)
+
+
+class PlainTextRenderer(PassthroughRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(PassthroughRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JSONStreamRenderer(PassthroughRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+
+class PrometheusRenderer(PassthroughRenderer):
+    media_type = 'text/plain'
+    format = 'prometheus'
@@ -0,0 +1,110 @@
+'''Чтение с реплик базы.
+
+Реплики перечисляются в DB_REPLICAS и становятся алиасами
+DATABASE_REPLICAS. ReplicaMiddleware разрешает чтение с реплик только
+безопасным запросам пользователя, который недавно ничего не менял;
+ReplicaRouter выбирает для такого запроса одну реплику по кругу и
+отправляет на нее все чтения запроса. Реплика, к которой не удалось
+подключиться, пропускается REPLICA_RETRY_SECONDS секунд.'''
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+PRIMARY = DEFAULT_DB_ALIAS
+
+
+class ReadState:
+    '''Чтение текущего запроса: разрешены ли реплики и какая выбрана'''
+
+    def __init__(self, replicas):
+        self.replicas = replicas
+        self.alias = None
+
+
+current_reads = ContextVar('current_reads', default=None)
+
+
+class ReplicaSet:
+    '''Реплики по кругу с учетом недоступных'''
+
+    def __init__(self, aliases):
+        self.aliases = list(aliases)
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.down_until = {}
+
+    def is_up(self, alias):
+        return self.down_until.get(alias, 0) <= time.monotonic()
+
+    def mark_down(self, alias):
+        with self.lock:
+            self.down_until[alias] = (time.monotonic()
+                                      + settings.REPLICA_RETRY_SECONDS)
+
+    def choose(self):
+        '''Следующая по кругу доступная реплика или основная база'''
+        if not self.aliases:
+            return PRIMARY
+        start = next(self.counter)
+        for offset in range(len(self.aliases)):
+            alias = self.aliases[(start + offset) % len(self.aliases)]
+            if not self.is_up(alias):
+                continue
+            try:
+                connections[alias].ensure_connection()
+            except DatabaseError:
+                self.mark_down(alias)
+                continue
+            return alias
+        return PRIMARY
+
+    def status(self):
+        return {alias: self.is_up(alias) for alias in self.aliases}
+
+
+replica_set = ReplicaSet(settings.DATABASE_REPLICAS)
+
+
+@contextmanager
+def reads(replicas):
+    '''Чтение с реплик (replicas=True) или с основной базы для кода
+    внутри блока'''
+    token = current_reads.set(ReadState(replicas))
+    try:
+        yield current_reads.get()
+    finally:
+        current_reads.reset(token)
+
+
+def use_primary():
+    '''Чтение с основной базы: для данных, которые кэшируются до
+    следующего изменения и не должны взяться с отстающей реплики'''
+    return reads(False)
+
+
+class ReplicaRouter:
+    '''Чтения запроса, которому разрешены реплики, идут на одну реплику;
+    запись, транзакции и миграции - только на основную базу'''
+
+    def db_for_read(self, model, **hints):
+        state = current_reads.get()
+        if (state is None or not state.replicas
+                or connections[PRIMARY].in_atomic_block):
+            return PRIMARY
+        if state.alias is None:
+            state.alias = replica_set.choose()
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,26 @@
+'''Полнотекстовый поиск рецептов.
+
+Recipe.search_vector заполняется триггерами базы (название - вес A,
+ингредиенты - B, описание - C) и индексирован GIN, поэтому поиск не
+сканирует таблицу, в отличие от ILIKE '%...%'.'''
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from api.constants import SEARCH_CONFIG
+
+
+def search_query(value):
+    return SearchQuery(value, config=SEARCH_CONFIG, search_type='websearch')
+
+
+def search_recipes(queryset, value):
+    '''Рецепты, подходящие под запрос, с релевантностью rank;
+    сначала самые релевантные. ts_rank возвращает real, а значение из
+    курсора сравнивается как double precision, поэтому rank приводится
+    к double precision: иначе на границе страницы строки теряются или
+    повторяются.'''
+    query = search_query(value)
+    return queryset.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+    ).order_by('-rank', '-id')
@@ -0,0 +1,149 @@
+import random
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from api import popularity
+from api.cache import bump_generation
+from api.counters import id_ranges, reconcile
+from recipes.loaders import read_rows
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Tag, TagsRecipe)
+from users.models import Follow
+
+User = get_user_model()
+
+SEED_PREFIX = 'seed'
+# Сгенерированные пользователи узнаются по домену почты: зона .invalid
+# зарезервирована (RFC 2606), настоящего адреса в ней быть не может.
+SEED_EMAIL_DOMAIN = 'seed.invalid'
+SEED_IMAGE = 'recipes/images/temp.png'
+SEED_TAGS = (
+    ('Завтрак', '#F08080', 'breakfast'),
+    ('Обед', '#FF8C00', 'lunch'),
+    ('Ужин', '#7FFFD4', 'dinner'),
+)
+INGREDIENTS_PER_RECIPE = 6
+BATCH_SIZE = 1000
+
+
+def seed_ingredients():
+    '''Загружает ingredients.csv, если справочник пуст'''
+    if Ingredient.objects.exists():
+        return
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=name, measurement_unit=measurement_unit)
+         for name, measurement_unit in read_rows(
+             settings.BASE_DIR / 'ingredients.csv',
+             ('name', 'measurement_unit'))),
+        batch_size=BATCH_SIZE)
+
+
+def seed_tags():
+    '''Создает базовые теги, если их нет'''
+    Tag.objects.bulk_create(
+        (Tag(name=name, color=color, slug=slug)
+         for name, color, slug in SEED_TAGS),
+        ignore_conflicts=True)
+    return list(Tag.objects.all())
+
+
+def seed_dataset(users=200, recipes=2000, follows=50, favorites=30,
+                 seed=0, carts=None):
+    '''Наполняет базу пользователями и рецептами; каждый пользователь
+    подписан на follows авторов, добавил favorites рецептов в
+    избранное и carts (по умолчанию столько же) в список покупок.
+    Возвращает пользователя, от имени которого удобно выполнять
+    запросы.'''
+    rnd = random.Random(seed)
+    seed_ingredients()
+    tags = seed_tags()
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+
+    User.objects.bulk_create(
+        (User(username=f'{SEED_PREFIX}{i}',
+              email=f'{SEED_PREFIX}{i}@{SEED_EMAIL_DOMAIN}',
+              first_name='Имя', last_name='Фамилия',
+              password='!')
+         for i in range(users)),
+        batch_size=BATCH_SIZE)
+    authors = list(seed_users().order_by('id'))
+    probe = authors[0]
+
+    Recipe.objects.bulk_create(
+        (Recipe(author=rnd.choice(authors), name=f'Рецепт {i}',
+                image=SEED_IMAGE, text='Описание рецепта',
+                cooking_time=rnd.randint(1, 120))
+         for i in range(recipes)),
+        batch_size=BATCH_SIZE)
+    recipe_ids = list(Recipe.objects.filter(
+        author__in=authors).values_list('id', flat=True))
+
+    TagsRecipe.objects.bulk_create(
+        (TagsRecipe(recipe_id=recipe_id, tag=tag)
+         for recipe_id in recipe_ids
+         for tag in rnd.sample(tags, rnd.randint(1, len(tags)))),
+        batch_size=BATCH_SIZE)
+    links = (IngredientRecipe(recipe_id=recipe_id,
+                              ingredient_id=ingredient_id,
+                              amount=rnd.randint(1, 500))
+             for recipe_id in recipe_ids
+             for ingredient_id in rnd.sample(
+                 ingredient_ids,
+                 min(INGREDIENTS_PER_RECIPE, len(ingredient_ids))))
+    # Триггеры на связях пересчитывают рецепты запросами по recipe_id;
+    # пока у таблиц нет статистики, планировщик выбирает для них полный
+    # перебор, и каждая следующая пачка вставляется дольше предыдущей
+    IngredientRecipe.objects.bulk_create(islice(links, BATCH_SIZE))
+    analyze(Recipe, IngredientRecipe)
+    IngredientRecipe.objects.bulk_create(links, batch_size=BATCH_SIZE)
+
+    Follow.objects.bulk_create(
+        (Follow(user=user, author=author)
+         for user in authors
+         for author in rnd.sample(authors, min(follows + 1, len(authors)))
+         if author != user),
+        batch_size=BATCH_SIZE)
+    if carts is None:
+        carts = favorites
+    for model, count in ((Favorite, favorites), (ShoppingCart, carts)):
+        model.objects.bulk_create(
+            (model(user=user, recipe_id=recipe_id)
+             for user in authors
+             for recipe_id in rnd.sample(recipe_ids,
+                                         min(count, len(recipe_ids)))),
+            batch_size=BATCH_SIZE)
+    # bulk_create не вызывает сигналы, счетчики пересчитываются явно
+    for _ in reconcile(BATCH_SIZE):
+        pass
+    for first_id, last_id in id_ranges(Recipe, BATCH_SIZE):
+        popularity.update_range(first_id, last_id)
+    # и поколения кэша сбрасываются после коммита
+    transaction.on_commit(bump_seed_generations)
+    return probe
+
+
+def bump_seed_generations():
+    for model in (Ingredient, IngredientRecipe, Recipe, Tag, TagsRecipe,
+                  User):
+        bump_generation(model._meta.label_lower)
+
+
+def analyze(*models):
+    '''Обновляет статистику планировщика для таблиц моделей'''
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(
+                f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+
+def seed_users():
+    return User.objects.filter(email__endswith=f'@{SEED_EMAIL_DOMAIN}')
+
+
+def clear_dataset():
+    '''Удаляет сгенерированных пользователей вместе с их рецептами,
+    подписками, избранным и списками покупок'''
+    return seed_users().delete()
@@ -1,9 +1,11 @@
-import base64
+import binascii
+import posixpath
 
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
 from django.core.validators import validate_email
 from django.core import exceptions as django_exceptions
+from django.db import transaction
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 from djoser.serializers import UserCreateSerializer, UserSerializer
@@ -13,8 +15,12 @@ from recipes.models import (
     IngredientRecipe, Favorite,
     ShoppingCart)
 from users.models import Follow
+from api import images
+from api.cache import bump_generation
+from api.counters import author_recipes_count
 from api.mixins import UsernameValidationMixin
-from api.constants import MAX_LENGTH_EMAIL, MAX_LENGTH_USERNAME
+from api.constants import (MATCH_MAX_INGREDIENTS, MAX_LENGTH_EMAIL,
+                           MAX_LENGTH_NAME, MAX_LENGTH_USERNAME)
 
 
 User = get_user_model()
@@ -57,6 +63,8 @@ class ShowUserSerializer(UserSerializer):
                   'last_name', 'is_subscribed',)
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if (self.context.get('request')
            and not self.context['request'].user.is_anonymous):
             return Follow.objects.filter(user=self.context['request'].user,
@@ -93,13 +101,43 @@ class Base64ImageField(serializers.ImageField):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            try:
+                name, content = images.content_file(imgstr, ext)
+            except images.ImageTooLarge:
+                raise serializers.ValidationError(
+                    'Картинка больше допустимого размера')
+            except (binascii.Error, UnicodeEncodeError):
+                raise serializers.ValidationError('Некорректный base64')
+            if isinstance(name, str):
+                super().to_internal_value(
+                    ContentFile(content, name=posixpath.basename(name)))
+                return name
+            data = name
 
         return super().to_internal_value(data)
 
 
-class UserRecipeSerializer(serializers.ModelSerializer):
+class ImageVariantsMixin(serializers.Serializer):
+    '''URL уменьшенной копии и WebP-версии картинки рецепта'''
+    image_thumbnail = serializers.SerializerMethodField()
+    image_webp = serializers.SerializerMethodField()
+
+    def build_url(self, url):
+        request = self.context.get('request')
+        if url and request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def get_image_thumbnail(self, obj):
+        return self.build_url(
+            images.variant_url(obj.image.name, obj.image_variants, 0))
+
+    def get_image_webp(self, obj):
+        return self.build_url(
+            images.variant_url(obj.image.name, obj.image_variants, 1))
+
+
+class UserRecipeSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     '''Для избранных, списка покупок и подписки'''
     image = Base64ImageField(read_only=True)
     name = serializers.ReadOnlyField()
@@ -107,7 +145,8 @@ class UserRecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time', ]
+        fields = ['id', 'name', 'image', 'image_thumbnail', 'image_webp',
+                  'cooking_time', ]
         read_only_fields = ('__all__',)
 
 
@@ -124,6 +163,9 @@ class UserSubscribeSerializer(ShowUserSerializer):
         read_only_fields = ('__all__',)
 
     def get_recipes(self, author):
+        if hasattr(author, 'recipes_preview'):
+            return UserRecipeSerializer(author.recipes_preview,
+                                        many=True).data
         limit = self.context.get('request').query_params.get('recipes_limit')
         try:
             recipes = (author.recipes.all()[:int(limit)]
@@ -133,6 +175,8 @@ class UserSubscribeSerializer(ShowUserSerializer):
         return UserRecipeSerializer(recipes, many=True).data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if (self.context.get('request')
            and not self.context['request'].user.is_anonymous):
             return Follow.objects.filter(user=self.context['request'].user,
@@ -140,7 +184,9 @@ class UserSubscribeSerializer(ShowUserSerializer):
         return False
 
     def get_recipes_count(self, obj: User) -> int:
-        return obj.recipes.count()
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return author_recipes_count(obj)
 
 
 class SubscribeAuthorSerializer(serializers.ModelSerializer):
@@ -166,6 +212,8 @@ class SubscribeAuthorSerializer(serializers.ModelSerializer):
         return valid_data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if (self.context.get('request')
            and not self.context['request'].user.is_anonymous):
             return Follow.objects.filter(user=self.context['request'].user,
@@ -173,7 +221,7 @@ class SubscribeAuthorSerializer(serializers.ModelSerializer):
         return False
 
     def get_recipes_count(self, valid_data):
-        return valid_data.recipes.count()
+        return author_recipes_count(valid_data)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -211,7 +259,7 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
-class ShowRecipeSerializer(serializers.ModelSerializer):
+class ShowRecipeSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     '''Список рецептов'''
     tags = TagSerializer(read_only=True, many=True)
     image = Base64ImageField(required=False, allow_null=True)
@@ -224,21 +272,88 @@ class ShowRecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ['id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time', ]
+                  'is_in_shopping_cart', 'name', 'image', 'image_thumbnail',
+                  'image_webp', 'text', 'cooking_time', ]
+
+    def to_representation(self, instance):
+        # Подписка на автора приходит аннотацией рецепта из
+        # RecipeViewSet.get_queryset, передаем ее в ShowUserSerializer.
+        if hasattr(instance, 'is_subscribed'):
+            instance.author.is_subscribed = instance.is_subscribed
+        return super().to_representation(instance)
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         return (not user.is_anonymous
                 and Favorite.objects.filter(recipe=obj, user=user).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         return (not user.is_anonymous
                 and ShoppingCart.objects.filter(recipe=obj,
                                                 user=user).exists())
 
 
+class MatchRecipeSerializer(ShowRecipeSerializer):
+    '''Рецепт, подобранный по продуктам'''
+    matched_count = serializers.IntegerField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+    missing_ingredients = serializers.ListField(
+        child=serializers.IntegerField(), read_only=True)
+
+    class Meta(ShowRecipeSerializer.Meta):
+        fields = ShowRecipeSerializer.Meta.fields + [
+            'matched_count', 'missing_count', 'missing_ingredients']
+
+
+class MatchQuerySerializer(serializers.Serializer):
+    '''Параметры подбора: ?ingredients=1&ingredients=2 или
+    ?ingredients=1,2 и необязательный max_missing'''
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        max_length=MATCH_MAX_INGREDIENTS)
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+    def to_internal_value(self, data):
+        ingredients = [item for value in data.getlist('ingredients')
+                       for item in value.split(',') if item]
+        values = {'ingredients': ingredients}
+        if 'max_missing' in data:
+            values['max_missing'] = data['max_missing']
+        return super().to_internal_value(values)
+
+
+class BulkIngredientSerializer(serializers.Serializer):
+    id = serializers.IntegerField(min_value=1)
+    amount = serializers.IntegerField(min_value=1, max_value=32767)
+
+
+class BulkRecipeSerializer(serializers.Serializer):
+    '''Рецепт пакетной загрузки. Существование тегов, ингредиентов и
+    автора проверяется сразу для всей пачки в api.bulk, поэтому здесь
+    только id без запросов к базе.'''
+    name = serializers.CharField(max_length=MAX_LENGTH_NAME)
+    text = serializers.CharField()
+    cooking_time = serializers.IntegerField(min_value=1, max_value=32767)
+    tags = serializers.ListField(child=serializers.IntegerField(min_value=1),
+                                 allow_empty=False)
+    ingredients = serializers.ListField(child=BulkIngredientSerializer(),
+                                        allow_empty=False)
+    image = Base64ImageField(required=False, allow_null=True)
+    author = serializers.CharField(required=False)
+
+    def validate_ingredients(self, value):
+        ids = [ingredient['id'] for ingredient in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться')
+        return value
+
+
 class CreateRecipeSerializer(serializers.ModelSerializer):
     '''Создание, редактирование рецепта'''
     ingredients = IngredientRecipeSerializer(
@@ -260,6 +375,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
                 {'error': 'Время приготовления не может быть < 1 минуты'})
         return value
 
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         ingredients = validated_data.pop('ingredientsRecipes')
@@ -277,33 +393,66 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
                     amount=current_amount
                 ))
         IngredientRecipe.objects.bulk_create(ingredients_list)
+        # bulk_create не вызывает сигналы
+        transaction.on_commit(
+            lambda: bump_generation(IngredientRecipe._meta.label_lower))
         return recipe
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def validate_ingredients(self, value):
+        ids = [ingredient['ingredient']['id'].id for ingredient in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться')
+        return value
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredientsRecipes')
-        tags = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.add(*tags)
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-        ingredients_list = []
-        for ingredient in ingredients:
-            ingredient_id = ingredient['ingredient']['id']
-            current_amount = ingredient.get('amount')
-            ingredients_list.append(
-                IngredientRecipe(
-                    recipe=instance,
-                    ingredient=ingredient_id,
-                    amount=current_amount
-                ))
-        IngredientRecipe.objects.bulk_create(ingredients_list)
+        ingredients = validated_data.pop('ingredientsRecipes', None)
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
         for field, value in validated_data.items():
             setattr(instance, field, value)
         instance.save()
         return instance
 
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        '''Сравнивает новые ингредиенты с сохраненными и меняет только
+        отличающиеся строки: у неизменных ингредиентов сохраняются id'''
+        amounts = {ingredient['ingredient']['id'].id: ingredient['amount']
+                   for ingredient in ingredients}
+        existing = {row.ingredient_id: row for row in
+                    IngredientRecipe.objects.filter(recipe=recipe)}
+        removed = [row.id for ingredient_id, row in existing.items()
+                   if ingredient_id not in amounts]
+        changed = []
+        for ingredient_id, row in existing.items():
+            if (ingredient_id in amounts
+                    and row.amount != amounts[ingredient_id]):
+                row.amount = amounts[ingredient_id]
+                changed.append(row)
+        added = [IngredientRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                                  amount=amount)
+                 for ingredient_id, amount in amounts.items()
+                 if ingredient_id not in existing]
+        if removed:
+            IngredientRecipe.objects.filter(id__in=removed).delete()
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        if added:
+            IngredientRecipe.objects.bulk_create(added)
+        if changed or added:
+            # bulk_update и bulk_create не вызывают сигналы
+            transaction.on_commit(
+                lambda: bump_generation(
+                    IngredientRecipe._meta.label_lower))
+
     def to_representation(self, instance):
         return ShowRecipeSerializer(
             instance,
@@ -0,0 +1,133 @@
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api import counters, images
+from api.authentication import invalidate_user_tokens
+from api.cache import bump_generation
+from api.connections import close_unusable_connections
+from api.toggles import bump_cart_generation
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Tag, TagsRecipe)
+
+User = get_user_model()
+
+VERSIONED_MODELS = (Ingredient, IngredientRecipe, Recipe, Tag, TagsRecipe)
+# Поля пользователя, которые попадают в рецепты как данные автора
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+def bump_model_generation(sender, **kwargs):
+    # Поколение меняется после коммита: иначе запрос, прочитавший
+    # старые данные до коммита, положит их в кэш под новым поколением
+    label = sender._meta.label_lower
+    transaction.on_commit(lambda: bump_generation(label))
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_model_generation, sender=model)
+    post_delete.connect(bump_model_generation, sender=model)
+
+request_started.connect(close_unusable_connections)
+
+
+@receiver(pre_save, sender=User)
+def remember_author_fields(sender, instance, update_fields=None, **kwargs):
+    '''Запоминает, меняются ли данные автора: регистрация, вход
+    (last_login), пароль и прочие поля кэш рецептов не сбрасывают'''
+    if instance._state.adding or (
+            update_fields is not None
+            and not set(update_fields) & set(AUTHOR_FIELDS)):
+        return
+    saved = sender.objects.filter(pk=instance.pk).values_list(
+        *AUTHOR_FIELDS).first()
+    instance._author_changed = saved != tuple(
+        getattr(instance, field) for field in AUTHOR_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def bump_author_generation(sender, instance, **kwargs):
+    if instance.__dict__.pop('_author_changed', False):
+        label = sender._meta.label_lower
+        transaction.on_commit(lambda: bump_generation(label))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_tokens(sender, instance, update_fields=None, **kwargs):
+    '''Выход (удаление токена), смена пароля, деактивация и любое другое
+    изменение пользователя сбрасывают его закэшированные токены'''
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    user_id = instance.user_id if sender is Token else instance.pk
+    transaction.on_commit(lambda: invalidate_user_tokens(user_id))
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def bump_cart(instance, **kwargs):
+    '''Изменения списка покупок через ORM (админка, удаление рецепта);
+    переключатель списка сбрасывает версию сам'''
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_cart_generation(user_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def bump_through_generation(sender, action, **kwargs):
+    if action.startswith('post_'):
+        label = sender._meta.label_lower
+        transaction.on_commit(lambda: bump_generation(label))
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_image_variants(instance, update_fields=None, **kwargs):
+    '''Строит варианты, только если картинка сохраняется и для нее
+    варианты еще не готовы: правка текста, счетчики и популярность
+    работу не ставят'''
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    name = instance.image.name
+    if name == instance.image_variants:
+        return
+    transaction.on_commit(lambda: images.schedule_variants(name))
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=Recipe)
+def remember_counted_target(sender, instance, update_fields=None, **kwargs):
+    '''Запоминает прежний рецепт (автора), чтобы при смене связи
+    перенести единицу счетчика со старого на новый'''
+    field = counters.COUNTED_FIELDS[sender]
+    if instance._state.adding or (
+            update_fields is not None and field not in update_fields):
+        return
+    instance._counted_target = sender.objects.filter(
+        pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+def count_saved(sender, instance, created, **kwargs):
+    current = counters.counted_target(instance)
+    if created:
+        counters.change_counter(sender, current, 1)
+        return
+    previous = instance.__dict__.pop('_counted_target', current)
+    if previous != current:
+        counters.change_counter(sender, previous, -1)
+        counters.change_counter(sender, current, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+def count_deleted(sender, instance, **kwargs):
+    counters.change_counter(sender, counters.counted_target(instance), -1)
@@ -0,0 +1,49 @@
+import pickle
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from rest_framework.authtoken.models import Token
+
+from api.authentication import TokenAuthentication, token_cache, token_key
+from api.tests.utils import IsolatedTestMixin
+
+User = get_user_model()
+
+
+class TokenCacheTest(IsolatedTestMixin, TestCase):
+    '''Закэшированный токен: без запросов к базе и без секретов в кэше'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='Secret-password-1')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+
+    def authenticate(self):
+        request = RequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return TokenAuthentication().authenticate(request)
+
+    def test_cached_entry_has_no_secrets(self):
+        self.authenticate()
+        data = pickle.dumps(cache.get(token_key(self.token.key)))
+        self.assertNotIn(self.token.key.encode(), data)
+        self.assertNotIn(self.user.password.encode(), data)
+
+    def test_cache_hit(self):
+        self.authenticate()
+        token_cache.clear()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual((user.pk, token.key), (self.user.pk, self.token.key))
+        self.assertTrue(user.is_active)
+        # Хэш пароля читается из базы при обращении
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('Secret-password-1'))
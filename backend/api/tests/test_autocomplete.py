@@ -0,0 +1,63 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.tests.utils import IsolatedTestMixin
+from recipes.models import Ingredient
+
+URL = '/api/ingredients/'
+
+
+class AutocompleteTest(IsolatedTestMixin, TestCase):
+    '''Подсказки ингредиентов отдаются из памяти процесса, в базу
+    (нечеткий поиск pg_trgm) запрос идет, только если в памяти ничего
+    не нашлось'''
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('абрикос', 'абрикосовый джем', 'ананас',
+                         'сушеный абрикос', 'mozzarella'))
+
+    def setUp(self):
+        self.client = APIClient()
+        # Первый запрос загружает справочник в память процесса
+        self.search('а')
+
+    def search(self, name):
+        response = self.client.get(URL, {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data]
+
+    def test_few_matches_do_not_query_database(self):
+        with self.assertNumQueries(0):
+            names = self.search('абри')
+        self.assertEqual(names, ['абрикос', 'абрикосовый джем',
+                                 'сушеный абрикос'])
+
+    def test_short_query_without_matches(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('яб'), [])
+
+    def test_substring_matches_skip_trigram_search(self):
+        # Запрос не короче порога нечеткого поиска, совпадения только
+        # по подстроке
+        with CaptureQueriesContext(connection) as queries:
+            names = self.search('рикос')
+        self.assertEqual(names, ['абрикос', 'абрикосовый джем',
+                                 'сушеный абрикос'])
+        self.assertEqual(len(queries), 0, queries.captured_queries)
+
+    def test_typo_falls_back_to_trigram_search(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                self.skipTest('В базе нет расширения pg_trgm')
+        with CaptureQueriesContext(connection) as queries:
+            names = self.search('mozarela')
+        self.assertEqual(names, ['mozzarella'])
+        self.assertEqual(len(queries), 1)
+        self.assertIn('SIMILARITY', queries[0]['sql'].upper())
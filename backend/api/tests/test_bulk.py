@@ -0,0 +1,22 @@
+from django.test import SimpleTestCase
+
+from api.bulk import limited, parse_lines
+
+
+class LimitedTest(SimpleTestCase):
+    '''Записи сверх лимита не читаются'''
+
+    def test_stops_reading_after_limit(self):
+        lines = iter(['{"name": "%d"}\n' % number for number in range(10)])
+        records = list(limited(parse_lines(lines), 3))
+        self.assertEqual([number for number, _, _ in records], [1, 2, 3, 4])
+        self.assertEqual([error is None for _, _, error in records],
+                         [True, True, True, False])
+        # Прочитана только первая лишняя строка
+        self.assertEqual(len(list(lines)), 6)
+
+    def test_within_limit(self):
+        lines = ['{"name": "%d"}' % number for number in range(3)]
+        records = list(limited(parse_lines(lines), 3))
+        self.assertEqual(len(records), 3)
+        self.assertTrue(all(error is None for _, _, error in records))
@@ -0,0 +1,65 @@
+from urllib.parse import urlsplit
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api import feed
+from api.seed import SEED_IMAGE, seed_dataset
+from api.tests.utils import IsolatedTestMixin
+from recipes.models import MaterializedFeed, Recipe
+from users.models import Follow
+
+PAGE_SIZE = 4
+
+
+class FeedTest(IsolatedTestMixin, TestCase):
+    '''Лента, собранная при чтении, и готовая лента отдают одни и те же
+    страницы, триггеры поддерживают готовую ленту'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=15, recipes=120, follows=5,
+                                favorites=2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def expected(self):
+        return list(Recipe.objects.filter(
+            author__following__user=self.user).order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+
+    def walk(self):
+        '''Листает ленту курсором и возвращает id рецептов'''
+        ids = []
+        url = f'/api/recipes/feed/?limit={PAGE_SIZE}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+            if url:
+                parts = urlsplit(url)
+                url = f'{parts.path}?{parts.query}'
+        return ids
+
+    def test_join_feed(self):
+        self.assertGreater(len(self.expected()), PAGE_SIZE)
+        self.assertEqual(self.walk(), self.expected())
+
+    def test_materialized_feed(self):
+        feed.materialize(0, [self.user.id])
+        self.assertTrue(MaterializedFeed.objects.filter(
+            user=self.user).exists())
+        self.assertEqual(self.walk(), self.expected())
+
+    def test_materialized_feed_follows_changes(self):
+        feed.materialize(0, [self.user.id])
+        author = Follow.objects.filter(user=self.user).first().author
+        Recipe.objects.create(author=author, name='Новый рецепт',
+                              image=SEED_IMAGE, text='Описание',
+                              cooking_time=5)
+        self.assertEqual(self.walk(), self.expected())
+        Follow.objects.filter(user=self.user, author=author).delete()
+        self.assertEqual(self.walk(), self.expected())
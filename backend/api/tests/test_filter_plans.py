@@ -0,0 +1,101 @@
+import json
+import re
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.seed import seed_dataset
+from api.tests.utils import IsolatedTestMixin
+from recipes.models import Recipe, Tag, TagsRecipe
+
+# Редкий тег: по частому тегу планировщику выгоднее идти по рецептам
+# и проверять теги каждого, а составной индекс нужен для выборочных
+RARE_TAG = 'rare'
+
+# Комбинации фильтров RecipeFilter и индексы, через которые должны
+# читаться отфильтрованные таблицы. В сочетаниях с частым тегом план
+# ведет самый выборочный фильтр.
+FILTER_PLANS = {
+    'author': ('author={author}',
+               {'recipes_recipe': 'recipe_author_date_idx'}),
+    'tags': ('tags={tag}', {'recipes_tagsrecipe': 'Unique recipe tag'}),
+    'is_favorited': ('is_favorited=1',
+                     {'recipes_favorite': 'Unique favorite'}),
+    'is_in_shopping_cart': ('is_in_shopping_cart=1',
+                            {'recipes_shoppingcart': 'cart_user_date_idx'}),
+    'author+tags': ('author={author}&tags=lunch',
+                    {'recipes_recipe': 'recipe_author_date_idx'}),
+    'is_favorited+tags': ('is_favorited=1&tags=lunch',
+                          {'recipes_favorite': 'Unique favorite'}),
+    'ordering=popular': ('ordering=popular&cursor=',
+                         {'recipes_recipe': 'recipe_popularity_idx'}),
+    'ordering=quick': ('ordering=quick&cursor=',
+                       {'recipes_recipe': 'recipe_cooking_time_idx'}),
+}
+PAGE_QUERY = re.compile(r'^SELECT (DISTINCT )?"recipes_recipe"\."id"')
+
+
+def used_indexes(node, indexes=None, alias=None):
+    '''Собирает из плана EXPLAIN (FORMAT JSON) индексы по псевдонимам
+    таблиц; Bitmap Index Scan относится к таблице родительского узла'''
+    if indexes is None:
+        indexes = {}
+    alias = node.get('Alias', alias)
+    if 'Index Name' in node:
+        indexes.setdefault(alias, set()).add(node['Index Name'])
+    for child in node.get('Plans', []):
+        used_indexes(child, indexes, alias)
+    return indexes
+
+
+class FilterPlanTest(IsolatedTestMixin, TestCase):
+    '''Фильтры списка рецептов читают таблицы через составные индексы
+    из миграций 0009 и 0013. На тестовых данных планировщику выгоднее
+    полный перебор, поэтому он запрещен (enable_seqscan = off). Проверяется
+    имя индекса у самой отфильтрованной таблицы, а не у подзапросов
+    аннотаций (псевдоним U0).'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=20, recipes=2000, follows=5,
+                                favorites=20)
+        tag = Tag.objects.create(name='Редкий', color='#000000',
+                                 slug=RARE_TAG)
+        TagsRecipe.objects.bulk_create(
+            TagsRecipe(recipe=recipe, tag=tag)
+            for recipe in Recipe.objects.all()[:10])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def get_page_query(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        for query in queries:
+            if PAGE_QUERY.match(query['sql']):
+                return query['sql']
+        self.fail(f'{url}: не найден запрос страницы')
+
+    def test_filters_use_indexes(self):
+        author = Recipe.objects.values_list('author', flat=True).first()
+        for name, (params, expected) in FILTER_PLANS.items():
+            with self.subTest(name):
+                sql = self.get_page_query(
+                    '/api/recipes/?'
+                    + params.format(author=author, tag=RARE_TAG))
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                indexes = used_indexes(plan[0]['Plan'])
+                for table, index in expected.items():
+                    self.assertIn(index, indexes.get(table, set()),
+                                  indexes)
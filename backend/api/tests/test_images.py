@@ -0,0 +1,106 @@
+import base64
+import hashlib
+import os
+import textwrap
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import images
+from api.constants import BASE64_CHUNK_SIZE
+from api.seed import SEED_IMAGE
+from api.tests.utils import IsolatedTestMixin
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class ImageVariantsTest(IsolatedTestMixin, TestCase):
+    '''Ссылки на варианты картинки строятся по отметке в рецепте,
+    без обращений к хранилищу'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='cook',
+                                       email='cook@example.com')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', image=SEED_IMAGE,
+            text='Описание', cooking_time=1)
+
+    def get_urls(self):
+        with mock.patch.object(FileSystemStorage, 'exists') as exists:
+            response = APIClient().get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        exists.assert_not_called()
+        return (response.data['image'], response.data['image_thumbnail'],
+                response.data['image_webp'])
+
+    def test_original_until_variants_are_ready(self):
+        image, thumbnail, webp = self.get_urls()
+        self.assertEqual(thumbnail, image)
+        self.assertEqual(webp, image)
+
+        images.generate_variants(SEED_IMAGE)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, SEED_IMAGE)
+        image, thumbnail, webp = self.get_urls()
+        self.assertTrue(thumbnail.endswith(images.THUMBNAIL_SUFFIX))
+        self.assertTrue(webp.endswith(images.WEBP_SUFFIX))
+
+    @override_settings(IMAGE_VARIANTS_ASYNC=True)
+    def test_worker_closes_connections(self):
+        # Задача выполняется сразу, но через ту же обертку, что и в пуле
+        with mock.patch.object(images.executor, 'submit',
+                               lambda task, *args: task(*args)), \
+                mock.patch.object(images, 'close_old_connections') as close, \
+                mock.patch.object(images, 'generate_variants') as generate:
+            images.schedule_variants(SEED_IMAGE)
+        generate.assert_called_once_with(SEED_IMAGE)
+        self.assertEqual(close.call_count, 2)
+
+    def test_unchanged_image_is_not_scheduled(self):
+        images.generate_variants(SEED_IMAGE)
+        self.recipe.refresh_from_db()
+        with mock.patch.object(images, 'schedule_variants') as schedule, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.recipe.text = 'Новое описание'
+            self.recipe.save()
+            self.recipe.save(update_fields=['popularity'])
+        schedule.assert_not_called()
+        with mock.patch.object(images, 'schedule_variants') as schedule, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.recipe.image = 'recipes/images/other.png'
+            self.recipe.save()
+        schedule.assert_called_once_with('recipes/images/other.png')
+
+    def test_existing_variants_are_marked_for_new_recipes(self):
+        images.generate_variants(SEED_IMAGE)
+        recipe = Recipe.objects.create(
+            author=self.user, name='Копия', image=SEED_IMAGE,
+            text='Описание', cooking_time=1)
+        self.assertEqual(recipe.image_variants, '')
+        images.generate_variants(SEED_IMAGE)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, SEED_IMAGE)
+
+
+class DecodeBase64Test(TestCase):
+    '''Base64 с переносами строк декодируется так же, как без них'''
+
+    def test_wrapped_input_larger_than_chunk(self):
+        content = os.urandom(2 * BASE64_CHUNK_SIZE + 1)
+        encoded = base64.b64encode(content).decode()
+        self.assertGreater(len(encoded), 2 * BASE64_CHUNK_SIZE)
+        for name, data in {
+            'lines': '\n'.join(textwrap.wrap(encoded, 76)),
+            'crlf and padding': ' ' + '\r\n'.join(
+                textwrap.wrap(encoded, 63)) + '\n',
+        }.items():
+            with self.subTest(name):
+                self.assertEqual(
+                    images.decode_base64(data, len(content)),
+                    (content, hashlib.sha256(content).hexdigest()))
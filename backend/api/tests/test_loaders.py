@@ -0,0 +1,28 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from recipes.loaders import read_rows
+
+FIELDS = ('name', 'measurement_unit')
+ITEMS = [{'name': 'соль', 'measurement_unit': 'г'},
+         {'name': 'вода', 'measurement_unit': 'мл'}]
+
+
+class ReadRowsTest(SimpleTestCase):
+    '''JSON lines дает те же строки, что и JSON-массив'''
+
+    def test_json_lines_match_json_array(self):
+        with tempfile.TemporaryDirectory() as directory:
+            array = Path(directory) / 'items.json'
+            array.write_text(json.dumps(ITEMS), encoding='utf-8')
+            lines = Path(directory) / 'items.jsonl'
+            lines.write_text(
+                '\n'.join(json.dumps(item) for item in ITEMS) + '\n\n',
+                encoding='utf-8')
+            self.assertEqual(list(read_rows(lines, FIELDS)),
+                             list(read_rows(array, FIELDS)))
+            self.assertEqual(list(read_rows(lines, FIELDS)),
+                             [('соль', 'г'), ('вода', 'мл')])
@@ -0,0 +1,24 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.profiling import metrics
+from api.tests.utils import IsolatedTestMixin
+
+
+@override_settings(QUERY_PROFILING=True)
+class QueryProfilingTest(IsolatedTestMixin, TestCase):
+    '''Метрики профилирования по методу и view'''
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_unknown_methods_share_one_key(self):
+        client = APIClient()
+        response = client.get('/api/tags/')
+        self.assertIn('Server-Timing', response)
+        for method in ('FOO', 'BAR', 'PROPFIND'):
+            client.generic(method, '/api/tags/')
+        keys = {(view['method'], view['view']) for view in metrics.report()}
+        self.assertEqual(keys, {('GET', 'api:tags-list'),
+                                ('OTHER', 'api:tags-list')})
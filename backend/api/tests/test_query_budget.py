@@ -0,0 +1,82 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.seed import seed_dataset
+from api.tests.utils import IsolatedTestMixin
+from recipes.models import Ingredient, Recipe
+
+SMALL_PAGE = 1
+LARGE_PAGE = 50
+
+# Число SQL-запросов на один вызов эндпоинта. Оно не должно зависеть
+# от размера страницы.
+QUERY_BUDGETS = {
+    'recipes-list': 5,
+    'recipes-list-filtered': 5,
+    'recipes-detail': 4,
+    'users-list': 2,
+    'users-subscriptions': 3,
+    'ingredients-search': 0,
+    'tags-list': 0,
+    'recipes-download-shopping-cart': 1,
+    'recipes-match': 5,
+    'recipes-feed': 5,
+}
+
+
+class QueryBudgetTest(IsolatedTestMixin, TestCase):
+    '''Число запросов основных эндпоинтов API'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=60, recipes=300, follows=55,
+                                favorites=55)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_urls(self):
+        recipe = Recipe.objects.filter(author=self.user).first()
+        ingredient = Ingredient.objects.first()
+        return {
+            'recipes-list': '/api/recipes/?limit={limit}',
+            'recipes-list-filtered': (
+                '/api/recipes/?limit={limit}&is_favorited=1'
+                '&tags=breakfast&tags=dinner'),
+            'recipes-detail': f'/api/recipes/{recipe.id}/',
+            'users-list': '/api/users/?limit={limit}',
+            'users-subscriptions': (
+                '/api/users/subscriptions/?limit={limit}'
+                '&recipes_limit=3'),
+            'ingredients-search': (
+                f'/api/ingredients/?name={ingredient.name[:2]}'),
+            'tags-list': '/api/tags/',
+            'recipes-download-shopping-cart': (
+                '/api/recipes/download_shopping_cart/'),
+            'recipes-match': (
+                '/api/recipes/match/?limit={limit}&ingredients='
+                + ','.join(map(str, recipe.ingredient_ids[:3]))),
+            'recipes-feed': '/api/recipes/feed/?limit={limit}',
+        }
+
+    def get(self, url):
+        response = self.client.get(url)
+        if hasattr(response, 'streaming_content'):
+            b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, url)
+        return response
+
+    def test_budgets(self):
+        for name, url in self.get_urls().items():
+            with self.subTest(name):
+                # Первый запрос загружает справочники в память процесса
+                self.get(url.format(limit=SMALL_PAGE))
+                for limit in (SMALL_PAGE, LARGE_PAGE):
+                    with self.assertNumQueries(QUERY_BUDGETS[name]):
+                        response = self.get(url.format(limit=limit))
+                # Большая страница должна содержать несколько строк,
+                # иначе запросы на строку не заметны
+                if '{limit}' in url:
+                    self.assertGreater(len(response.data['results']),
+                                       SMALL_PAGE)
@@ -0,0 +1,86 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.seed import seed_dataset
+from api.tests.utils import IsolatedTestMixin
+from recipes.models import (Ingredient, IngredientRecipe, Recipe, Tag,
+                            TagsRecipe)
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+LINK_TABLES = ('recipes_ingredientrecipe', 'recipes_tagsrecipe')
+
+
+class RecipeUpdateTest(IsolatedTestMixin, TestCase):
+    '''Редактирование рецепта меняет только отличающиеся ингредиенты и
+    теги, у неизменных связей сохраняются id'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=5, recipes=20, follows=2, favorites=2)
+        cls.recipe = Recipe.objects.filter(author=cls.user).first()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.ingredients, self.tags = self.get_links()
+        self.amounts = {ingredient_id: amount for ingredient_id, (_, amount)
+                        in self.ingredients.items()}
+
+    def get_links(self):
+        return (
+            {row.ingredient_id: (row.id, row.amount) for row in
+             IngredientRecipe.objects.filter(recipe=self.recipe)},
+            {row.tag_id: row.id for row in
+             TagsRecipe.objects.filter(recipe=self.recipe)},
+        )
+
+    def patch(self, ingredients, tags, **fields):
+        '''Редактирует рецепт и возвращает запросы на запись в связи'''
+        data = {
+            'ingredients': [{'id': ingredient_id, 'amount': amount}
+                            for ingredient_id, amount in ingredients.items()],
+            'tags': tags,
+            **fields,
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/api/recipes/{self.recipe.id}/',
+                                         data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [query['sql'] for query in queries
+                if query['sql'].startswith(WRITES)
+                and any(table in query['sql'] for table in LINK_TABLES)]
+
+    def test_unchanged_links_are_not_written(self):
+        writes = self.patch(self.amounts, list(self.tags),
+                            name='Новое название')
+        self.assertEqual(writes, [])
+        self.assertEqual(self.get_links(), (self.ingredients, self.tags))
+
+    def test_changed_links_keep_ids(self):
+        kept, changed, removed = (list(self.amounts)[:-2],
+                                  *list(self.amounts)[-2:])
+        added = Ingredient.objects.exclude(
+            id__in=list(self.amounts)).values_list('id', flat=True).first()
+        amounts = {ingredient_id: self.amounts[ingredient_id]
+                   for ingredient_id in kept}
+        amounts[changed] = self.amounts[changed] + 1
+        amounts[added] = 7
+        tags = list(Tag.objects.exclude(id__in=list(self.tags)).values_list(
+            'id', flat=True)[:1]) + list(self.tags)[:1]
+
+        self.patch(amounts, tags)
+
+        ingredients, tag_links = self.get_links()
+        for ingredient_id in kept:
+            self.assertEqual(ingredients[ingredient_id],
+                             self.ingredients[ingredient_id])
+        self.assertEqual(ingredients[changed],
+                         (self.ingredients[changed][0], amounts[changed]))
+        self.assertNotIn(removed, ingredients)
+        self.assertEqual(ingredients[added][1], 7)
+        self.assertEqual(set(tag_links), set(tags))
+        self.assertEqual(tag_links[tags[-1]], self.tags[tags[-1]])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.ingredient_ids, sorted(amounts))
@@ -0,0 +1,114 @@
+import unittest
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.middleware import PIN_COOKIE
+from api.replicas import PRIMARY, ReplicaRouter, replica_set
+from api.seed import SEED_IMAGE
+from api.tests.utils import IsolatedTestMixin
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+@unittest.skipUnless(settings.DATABASE_REPLICAS,
+                     'Реплики не заданы, укажите DB_REPLICAS')
+class ReplicaRoutingTest(IsolatedTestMixin, TransactionTestCase):
+    '''Маршрутизация между основной базой и репликами. Реплики в тестах -
+    зеркала основной базы (TEST MIRROR), поэтому данные записываются
+    без транзакции теста.'''
+    databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username='reader',
+                                   email='reader@example.com')
+        self.recipe = Recipe.objects.create(author=user, name='Рецепт',
+                                            image=SEED_IMAGE, text='-',
+                                            cooking_time=1)
+        self.token = Token.objects.create(user=user)
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def tearDown(self):
+        replica_set.down_until.clear()
+
+    def client_with_token(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return client
+
+    def get(self, client, url=None):
+        '''Выполняет запрос и возвращает алиасы баз, в которые ушли
+        запросы за данными (поиск токена всегда идет в основную базу)'''
+        used = set()
+
+        def record(alias):
+            def wrapper(execute, sql, params, many, context):
+                if 'authtoken_token' not in sql:
+                    used.add(alias)
+                return execute(sql, params, many, context)
+            return wrapper
+
+        with ExitStack() as stack:
+            for alias in self.databases:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(record(alias)))
+            response = client.get(url or self.url)
+        self.assertEqual(response.status_code, 200)
+        return used
+
+    @override_settings(CACHE_SHARED=True)
+    def test_reads_go_to_replicas_in_turn(self):
+        used = [self.get(self.client_with_token())
+                for _ in range(2 * len(settings.DATABASE_REPLICAS))]
+        for aliases in used:
+            self.assertEqual(len(aliases), 1)
+            self.assertNotIn(PRIMARY, aliases)
+        self.assertEqual(set.union(*used), set(settings.DATABASE_REPLICAS))
+
+    @override_settings(CACHE_SHARED=True)
+    def test_reads_after_write_are_pinned_to_primary(self):
+        client = self.client_with_token()
+        response = client.post(f'{self.url}favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.get(client), {PRIMARY})
+        # Другой клиент с тем же токеном, но без cookie
+        self.assertEqual(self.get(self.client_with_token()), {PRIMARY})
+
+    @override_settings(CACHE_SHARED=False)
+    def test_token_reads_use_primary_without_shared_cache(self):
+        # Закрепление в кэше процесса другой воркер не увидит
+        self.assertEqual(self.get(self.client_with_token()), {PRIMARY})
+
+    @override_settings(CACHE_SHARED=True)
+    def test_unavailable_replica_is_skipped(self):
+        alias = settings.DATABASE_REPLICAS[0]
+        connection = connections[alias]
+        port = connection.settings_dict['PORT']
+        connection.close()
+        connection.settings_dict['PORT'] = 1
+        try:
+            used = [self.get(self.client_with_token())
+                    for _ in settings.DATABASE_REPLICAS]
+        finally:
+            connection.close()
+            connection.settings_dict['PORT'] = port
+        self.assertFalse(replica_set.is_up(alias))
+        for aliases in used:
+            self.assertNotIn(alias, aliases)
+
+    def test_transactions_and_migrations_use_primary(self):
+        router = ReplicaRouter()
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Recipe), PRIMARY)
+        self.assertEqual(router.db_for_write(Recipe), PRIMARY)
+        for alias in settings.DATABASE_REPLICAS:
+            self.assertFalse(router.allow_migrate(alias, 'recipes'))
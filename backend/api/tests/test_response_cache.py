@@ -0,0 +1,92 @@
+import base64
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.cache import get_generation
+from api.seed import seed_dataset
+from api.tests.utils import IsolatedTestMixin, png
+from recipes.models import Ingredient, IngredientRecipe, Tag
+
+User = get_user_model()
+
+URL = '/api/recipes/'
+
+
+class ResponseCacheTest(IsolatedTestMixin, TestCase):
+    '''Кэш ответов анонимным пользователям сбрасывается после коммита
+    изменений, попадания и промахи видны staff'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=3, recipes=6, follows=1, favorites=1)
+        cls.admin = User.objects.create(username='admin',
+                                        email='admin@example.com',
+                                        is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self):
+        response = self.anonymous.get(URL)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def create_recipe(self):
+        image = base64.b64encode(png()).decode()
+        return self.client.post(URL, {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': f'data:image/png;base64,{image}',
+            'tags': [Tag.objects.first().id],
+            'ingredients': [{'id': Ingredient.objects.first().id,
+                             'amount': 10}],
+        }, format='json')
+
+    def test_create_invalidates_after_commit(self):
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+        label = IngredientRecipe._meta.label_lower
+        generation = get_generation(label)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.create_recipe()
+            self.assertEqual(response.status_code, 201, response.data)
+            # До коммита поколения не меняются
+            self.assertEqual(get_generation(label), generation)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_generation(label), generation)
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['name'],
+                         'Новый рецепт')
+
+    def test_user_changes_outside_author_fields_keep_cache(self):
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create(username='newcomer',
+                                email='newcomer@example.com')
+            self.user.set_password('new-password')
+            self.user.save()
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Новое имя'
+            self.user.save()
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+
+    def test_stats_are_staff_only(self):
+        self.get()
+        self.get()
+        self.assertEqual(self.client.get('/api/_cache/').status_code, 403)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/_cache/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data,
+                         {'hit': 1, 'miss': 1, 'hit_ratio': 0.5})
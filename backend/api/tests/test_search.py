@@ -0,0 +1,62 @@
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.search import search_recipes
+from api.seed import SEED_IMAGE
+from api.tests.utils import IsolatedTestMixin
+from recipes.models import Recipe
+
+User = get_user_model()
+
+QUERY = 'суп'
+
+
+class SearchPaginationTest(IsolatedTestMixin, TestCase):
+    '''Курсор по релевантности не теряет и не повторяет рецепты с
+    одинаковой и почти одинаковой релевантностью'''
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='cook',
+                                     email='cook@example.com')
+        texts = (
+            # Одинаковая релевантность
+            ['Простой рецепт'] * 5
+            + ['Рецепт ' + 'с овощами ' * size for size in range(1, 8)]
+            # Близкая релевантность: слово повторяется в описании
+            + ['Суп и еще раз ' + 'суп ' * size for size in range(1, 5)])
+        Recipe.objects.bulk_create(
+            Recipe(author=author, name='Суп', image=SEED_IMAGE, text=text,
+                   cooking_time=10) for text in texts)
+        Recipe.objects.create(author=author, name='Каша', image=SEED_IMAGE,
+                              text='Без первого блюда', cooking_time=5)
+
+    def walk(self, page_size, total):
+        '''Листает результаты поиска курсором и возвращает id рецептов;
+        повторяющиеся страницы обрываются после total рецептов'''
+        client = APIClient()
+        ids = []
+        response = client.get('/api/recipes/', {
+            'search': QUERY, 'cursor': '', 'limit': page_size})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            if not response.data['next'] or len(ids) > total:
+                return ids
+            parts = urlsplit(response.data['next'])
+            response = client.get(f'{parts.path}?{parts.query}')
+
+    def test_cursor_keeps_every_recipe_once(self):
+        expected = list(search_recipes(Recipe.objects.all(), QUERY)
+                        .values_list('id', flat=True))
+        ranks = search_recipes(Recipe.objects.all(), QUERY).values_list(
+            'rank', flat=True)
+        self.assertEqual(len(expected), 16)
+        self.assertLess(len(set(ranks)), len(expected))
+        for page_size in (1, 2, 3, 5):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.walk(page_size, len(expected)),
+                                 expected)
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from api.seed import clear_dataset, seed_dataset, seed_users
+from api.tests.utils import IsolatedTestMixin
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class SeedDatasetTest(IsolatedTestMixin, TestCase):
+    '''Удаление сгенерированных данных не задевает настоящих
+    пользователей, даже с похожими именами'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='seedling',
+                                       email='seedling@example.com')
+        seed_dataset(users=5, recipes=10, follows=1, favorites=1)
+
+    def test_clear_keeps_real_users(self):
+        self.assertEqual(seed_users().count(), 5)
+        self.assertNotIn(self.user, seed_users())
+        clear_dataset()
+        self.assertFalse(seed_users().exists())
+        self.assertFalse(Recipe.objects.exists())
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
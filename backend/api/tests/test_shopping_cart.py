@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.seed import SEED_IMAGE
+from api.tests.utils import IsolatedTestMixin
+from recipes.models import Ingredient, IngredientRecipe, Recipe, ShoppingCart
+
+User = get_user_model()
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingCartDownloadTest(IsolatedTestMixin, TestCase):
+    '''Выгрузка списка покупок и ее ETag'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='buyer',
+                                       email='buyer@example.com')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', image=SEED_IMAGE,
+            text='Описание', cooking_time=1)
+        cls.flour = Ingredient.objects.create(name='мука',
+                                              measurement_unit='г')
+        cls.sugar = Ingredient.objects.create(name='сахар',
+                                              measurement_unit='г')
+        IngredientRecipe.objects.create(recipe=cls.recipe,
+                                        ingredient=cls.flour, amount=100)
+        IngredientRecipe.objects.create(recipe=cls.recipe,
+                                        ingredient=cls.sugar, amount=50)
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        response = self.client.get(URL, {'format': 'txt'}, **headers)
+        if response.status_code == 200:
+            content = b''.join(response.streaming_content).decode()
+        else:
+            content = None
+        return response, content
+
+    def test_unchanged_list_is_not_modified(self):
+        with CaptureQueriesContext(connection) as queries:
+            response, content = self.download()
+        self.assertIn('мука', content)
+        self.assertEqual(
+            sum('SUM(' in query['sql'] for query in queries), 1)
+        with self.assertNumQueries(0):
+            response, _ = self.download(response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def change_amounts(self):
+        for ingredient, amount in ((self.flour, 50), (self.sugar, 100)):
+            row = IngredientRecipe.objects.get(ingredient=ingredient)
+            row.amount = amount
+            row.save()
+
+    def rename(self):
+        self.sugar.name = 'сахарная пудра'
+        self.sugar.save()
+
+    def change_unit(self):
+        self.flour.measurement_unit = 'кг'
+        self.flour.save()
+
+    def remove_from_cart(self):
+        self.client.delete(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+
+    def test_etag_follows_content(self):
+        changes = {
+            'amounts swapped': self.change_amounts,
+            'ingredient renamed': self.rename,
+            'unit changed': self.change_unit,
+            'removed from cart': self.remove_from_cart,
+        }
+        for name, change in changes.items():
+            with self.subTest(name):
+                response, _ = self.download()
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                response, _ = self.download(response['ETag'])
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,68 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.seed import seed_dataset
+from api.tests.utils import IsolatedTestMixin
+from recipes.models import Recipe
+
+User = get_user_model()
+
+RECIPES_LIMIT = 2
+
+
+class SubscriptionsTest(IsolatedTestMixin, TestCase):
+    '''Подписки с последними рецептами авторов'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(users=10, recipes=80, follows=4,
+                                favorites=2)
+        cls.loner = User.objects.create(username='loner',
+                                        email='loner@example.com')
+
+    def get(self, user, query):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(f'/api/users/subscriptions/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_recipes_are_limited_per_author(self):
+        authors = self.get(self.user, f'recipes_limit={RECIPES_LIMIT}')
+        self.assertTrue(authors)
+        for author in authors:
+            expected = list(Recipe.objects.filter(
+                author=author['id']).order_by('-pub_date', '-id').values_list(
+                'id', flat=True)[:RECIPES_LIMIT])
+            self.assertEqual([recipe['id'] for recipe in author['recipes']],
+                             expected)
+
+    def test_without_limit_all_recipes_are_returned(self):
+        for author in self.get(self.user, ''):
+            count = Recipe.objects.filter(author=author['id']).count()
+            self.assertEqual(len(author['recipes']), count)
+
+    def test_empty_page(self):
+        self.assertEqual(
+            self.get(self.loner, f'recipes_limit={RECIPES_LIMIT}'), [])
+        # Курсор за последним автором
+        cursor = base64.urlsafe_b64encode(json.dumps(
+            [User.objects.order_by('id').last().id]).encode()).decode()
+        self.assertEqual(
+            self.get(self.user,
+                     f'cursor={cursor}&recipes_limit={RECIPES_LIMIT}'),
+            [])
+
+    def test_self_subscription_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.loner)
+        for user_id in (str(self.loner.id), f'0{self.loner.id}'):
+            with self.subTest(user_id):
+                response = client.post(f'/api/users/{user_id}/subscribe/')
+                self.assertEqual(response.status_code, 400)
+        response = client.post('/api/users/x/subscribe/')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,81 @@
+import threading
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from api.seed import SEED_IMAGE
+from api.tests.utils import IsolatedTestMixin
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow
+
+User = get_user_model()
+
+CLIENTS = 8
+ROUNDS = 3
+
+
+class ToggleConcurrencyTest(IsolatedTestMixin, TransactionTestCase):
+    '''Параллельные одинаковые запросы к избранному, списку покупок и
+    подпискам не создают дубликатов и не сбивают счетчики'''
+
+    def setUp(self):
+        self.user = User.objects.create(username='reader',
+                                        email='reader@example.com')
+        self.author = User.objects.create(username='author',
+                                          email='author@example.com')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', image=SEED_IMAGE,
+            text='Описание', cooking_time=1)
+
+    def race(self, method, url):
+        '''Одновременно отправляет CLIENTS одинаковых запросов'''
+        barrier = threading.Barrier(CLIENTS)
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def worker():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                response = getattr(client, method)(url)
+                with lock:
+                    statuses[response.status_code] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(CLIENTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def check_toggle(self, url, rows, counter=None):
+        for _ in range(ROUNDS):
+            for method, expected in (('post', 201), ('delete', 204)):
+                statuses = self.race(method, url)
+                self.assertEqual(statuses[expected], 1, dict(statuses))
+                self.assertEqual(rows.count(), int(method == 'post'))
+                if counter:
+                    self.assertEqual(
+                        Recipe.objects.values_list(counter, flat=True).get(
+                            pk=self.recipe.pk),
+                        rows.count())
+
+    def test_favorite(self):
+        self.check_toggle(f'/api/recipes/{self.recipe.id}/favorite/',
+                          Favorite.objects.filter(user=self.user),
+                          'favorites_count')
+
+    def test_shopping_cart(self):
+        self.check_toggle(f'/api/recipes/{self.recipe.id}/shopping_cart/',
+                          ShoppingCart.objects.filter(user=self.user),
+                          'in_carts_count')
+
+    def test_subscribe(self):
+        self.check_toggle(f'/api/users/{self.author.id}/subscribe/',
+                          Follow.objects.filter(user=self.user))
@@ -0,0 +1,40 @@
+import io
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from PIL import Image
+
+from api.seed import SEED_IMAGE
+
+
+def png(color='red', size=(4, 4)):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, 'PNG')
+    return output.getvalue()
+
+
+class IsolatedTestMixin:
+    '''Картинки тестов сохраняются во временный MEDIA_ROOT, варианты
+    строятся сразу в запросе. Кэш очищается: поколения моделей из
+    откаченных транзакций других тестов не должны оставлять справочники
+    в памяти процесса устаревшими.'''
+
+    @classmethod
+    def setUpClass(cls):
+        cache.clear()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root,
+                                               IMAGE_VARIANTS_ASYNC=False)
+        cls.media_settings.enable()
+        default_storage.save(SEED_IMAGE, ContentFile(png()))
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
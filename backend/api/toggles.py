@@ -0,0 +1,87 @@
+'''Переключатели избранного, списка покупок и подписок.
+
+Каждая операция - один SQL-запрос: строка вставляется через
+INSERT ... ON CONFLICT DO NOTHING (или удаляется через DELETE) в CTE,
+а итоговый SELECT возвращает сам объект и признак того, что строка
+действительно изменилась. Уникальные ограничения таблиц гарантируют,
+что параллельные запросы не создадут дубликатов. Если у цели есть
+счетчик связей, он меняется в том же запросе и только при реальном
+изменении.'''
+from django.contrib.auth import get_user_model
+
+from api.cache import bump_generation
+from api.counters import RECIPE_COUNTERS
+
+User = get_user_model()
+
+CART_LABEL = 'shopping-cart:{}'
+
+ADD_SQL = '''
+WITH target AS (
+    SELECT {fields} FROM {target_table} WHERE id = %(target)s
+), changed AS (
+    INSERT INTO {table} (user_id, {column}{extra_columns})
+    SELECT %(user)s, id{extra_values} FROM target
+    ON CONFLICT DO NOTHING
+    RETURNING {column}
+){counted}
+SELECT {fields}, EXISTS (SELECT 1 FROM changed) AS changed FROM target
+'''
+
+REMOVE_SQL = '''
+WITH target AS (
+    SELECT {fields} FROM {target_table} WHERE id = %(target)s
+), changed AS (
+    DELETE FROM {table}
+    WHERE user_id = %(user)s AND {column} IN (SELECT id FROM target)
+    RETURNING {column}
+){counted}
+SELECT {fields}, EXISTS (SELECT 1 FROM changed) AS changed FROM target
+'''
+
+COUNTED_SQL = ''', counted AS (
+    UPDATE {target_table} SET {counter} = GREATEST({counter} {sign} 1, 0)
+    WHERE id IN (SELECT {column} FROM changed)
+)'''
+
+
+def bump_cart_generation(user_id):
+    '''Версия списка покупок пользователя для ETag выгрузки'''
+    bump_generation(CART_LABEL.format(user_id))
+
+
+def toggle(model, target_field, user, target_id, add, fields=('id',)):
+    '''Добавляет или удаляет связь user -> target_id.
+
+    Возвращает (объект цели или None, если его нет; изменилась ли
+    связь). Объект цели содержит только поля fields.'''
+    try:
+        target_id = int(target_id)
+    except (TypeError, ValueError):
+        return None, False
+    field = model._meta.get_field(target_field)
+    target_model = field.related_model
+    extra_columns = extra_values = ''
+    if any(f.name == 'pub_date' for f in model._meta.fields):
+        extra_columns, extra_values = ', pub_date', ', NOW()'
+    names = {
+        'target_table': target_model._meta.db_table,
+        'column': field.column,
+    }
+    counted = ''
+    if model in RECIPE_COUNTERS:
+        counted = COUNTED_SQL.format(counter=RECIPE_COUNTERS[model],
+                                     sign='+' if add else '-', **names)
+    sql = (ADD_SQL if add else REMOVE_SQL).format(
+        fields=', '.join(fields),
+        table=model._meta.db_table,
+        extra_columns=extra_columns,
+        extra_values=extra_values,
+        counted=counted,
+        **names,
+    )
+    rows = list(target_model.objects.raw(
+        sql, {'target': target_id, 'user': user.id}))
+    if not rows:
+        return None, False
+    return rows[0], rows[0].changed
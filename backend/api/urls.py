@@ -4,7 +4,9 @@ from rest_framework.routers import DefaultRouter
 from api.views import (
     UserViewSet,
     RecipeViewSet,
+    CacheStatsView,
     IngredientViewSet,
+    MetricsView,
     TagViewSet,
 )
 
@@ -17,6 +19,8 @@ router.register('ingredients', IngredientViewSet, 'ingredients')
 router.register('recipes', RecipeViewSet, 'recipes')
 
 urlpatterns = (
+    path("_metrics/", MetricsView.as_view(), name="metrics"),
+    path("_cache/", CacheStatsView.as_view(), name="cache-stats"),
     path("", include(router.urls)),
     path("auth/", include("djoser.urls.authtoken")),
 )
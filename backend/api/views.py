@@ -1,37 +1,105 @@
-from django.db.models import F, Sum
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+from collections import defaultdict
+
+from django.db.models import (BooleanField, Exists, F, OuterRef, Subquery,
+                              Sum, Value)
+from django.db.models.functions import Coalesce
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, status, viewsets
+from rest_framework import filters, serializers, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
 from djoser.views import UserViewSet
 
 from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                            ShoppingCart, Tag)
+                            ShoppingCart, Tag, TagsRecipe)
 from users.models import Follow
 
-from api.filters import RecipeFilter
-from api.pagination import CustomPaginator
+from api.autocomplete import autocomplete, ingredient_index
+from api.bulk import import_recipes, limited, parse_lines, parse_list
+from api.cache import get_generations, get_stats, make_key
+from api.catalogue import tag_catalogue
+from api.constants import (BULK_CHUNK_SIZE, BULK_RECIPES_LIMIT,
+                           INGREDIENTS_SEARCH_LIMIT)
+from api.exporters import EXPORTERS
+from api.feed import feed_recipes
+from api.filters import (DEFAULT_RECIPE_ORDERING, RECIPE_ORDERINGS,
+                         SEARCH_ORDERING, RecipeFilter)
+from api.matching import MATCH_ORDERING, match_recipes
+from api.mixins import AnonymousCacheMixin, AsyncReadMixin
+from api.pagination import CustomPaginator, KeysetPaginator
+from api.parsers import JSONLinesParser
 from api.permissions import AdminOrAuthorPermission
+from api.profiling import metrics, to_prometheus
+from api.renderers import (CSVRenderer, JSONStreamRenderer,
+                           PlainTextRenderer, PrometheusRenderer)
 from api.serializers import (CreateRecipeSerializer, IngredientSerializer,
+                             MatchQuerySerializer, MatchRecipeSerializer,
                              SetPasswordSerializer, ShowRecipeSerializer,
                              ShowUserSerializer, SignUpSerializer,
                              SubscribeAuthorSerializer, TagSerializer,
                              UserRecipeSerializer, UserSubscribeSerializer)
+from api.toggles import CART_LABEL, bump_cart_generation, toggle
 
 
 User = get_user_model()
 
+USER_RECIPE_FIELDS = ('id', 'name', 'image', 'image_variants',
+                      'cooking_time')
+SUBSCRIBE_AUTHOR_FIELDS = ('id', 'email', 'username', 'first_name',
+                           'last_name')
+
+# Справочники почти не меняются: браузер и nginx могут отдавать их
+# из своего кэша, а после max_age перепроверяют по ETag
+catalogue_cache_control = cache_control(
+    public=True, max_age=settings.CATALOGUE_MAX_AGE)
+
+
+def shopping_cart_ingredients(user):
+    '''Ингредиенты рецептов из списка покупок, сложенные по названию и
+    единице измерения'''
+    return IngredientRecipe.objects.filter(
+        recipe__shopping_cart_recipe__user=user).values(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit')).annotate(
+        amount=Sum('amount')).order_by('name', 'measurement_unit')
+
+
+def shopping_cart_etag(request, *args, **kwargs):
+    '''ETag списка покупок из версии списка пользователя и поколений
+    рецептов и ингредиентов: 304 отдается без запроса к базе'''
+    generations = get_generations(
+        CART_LABEL.format(request.user.id),
+        *(model._meta.label_lower
+          for model in (Recipe, IngredientRecipe, Ingredient)))
+    return make_key(request.accepted_renderer.format, generations)
+
 
 class UserViewSet(UserViewSet):
 
     queryset = User.objects.all()
     pagination_class = CustomPaginator
+    cursor_ordering = ('id',)
     http_method_names = ['get', 'post', 'delete']
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_subscribed=Value(False, output_field=BooleanField()))
+        return queryset.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))))
+
     def get_serializer_class(self):
 
         if self.action in ['subscriptions', 'subscribe']:
@@ -66,45 +134,80 @@ class UserViewSet(UserViewSet):
 
     @action(detail=False, methods=['get'],
             permission_classes=(IsAuthenticated,),
-            pagination_class=CustomPaginator)
+            pagination_class=KeysetPaginator)
     def subscriptions(self, request):
-        queryset = User.objects.filter(following__user=request.user)
+        queryset = User.objects.filter(following__user=request.user).annotate(
+            recipes_count=Coalesce('author_stats__recipes_count', 0),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
         page = self.paginate_queryset(queryset)
+        self.attach_recipes_preview(
+            page, request.query_params.get('recipes_limit'))
         serializer = UserSubscribeSerializer(page, many=True,
                                              context={'request': request})
         return self.get_paginated_response(serializer.data)
 
+    @staticmethod
+    def attach_recipes_preview(authors, limit):
+        '''Загружает последние рецепты авторов страницы одним запросом.
+        При заданном limit для каждого автора отбираются первые limit
+        рецептов подзапросом по индексу (автор, дата публикации).'''
+        try:
+            limit = int(limit) if limit else None
+        except ValueError:
+            raise serializers.ValidationError({'errors': 'Ошибка'})
+        previews = defaultdict(list)
+        if authors and (limit is None or limit > 0):
+            recipes = Recipe.objects.filter(author__in=authors).only(
+                'id', 'name', 'image', 'image_variants', 'cooking_time',
+                'author_id', 'pub_date').order_by('-pub_date', '-id')
+            if limit is not None:
+                recipes = recipes.filter(id__in=Subquery(
+                    Recipe.objects.filter(author=OuterRef('author'))
+                    .order_by('-pub_date', '-id').values('id')[:limit]))
+            for recipe in recipes:
+                previews[recipe.author_id].append(recipe)
+        for author in authors:
+            author.recipes_preview = previews[author.id]
+
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(IsAuthenticated,))
     def subscribe(self, request, **kwargs):
-        author = get_object_or_404(User, id=kwargs['id'])
+        try:
+            author_id = int(kwargs['id'])
+        except ValueError:
+            raise Http404
+        if author_id == request.user.id:
+            return Response({'detail': 'Не подписывайтесь на себя'},
+                            status=status.HTTP_400_BAD_REQUEST)
 
         if request.method == 'POST':
-            serializer = SubscribeAuthorSerializer(
-                author, data=request.data, context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            if author == request.user:
-                return Response({'detail': 'Не подписывайтесь на себя'},
-                                status=status.HTTP_400_BAD_REQUEST)
-            if Follow.objects.filter(user=request.user,
-                                     author=author).exists():
+            author, created = toggle(Follow, 'author', request.user,
+                                     author_id, add=True,
+                                     fields=SUBSCRIBE_AUTHOR_FIELDS)
+            if author is None:
+                raise Http404
+            if not created:
                 return Response({'detail': 'Вы уже подписаны'},
                                 status=status.HTTP_400_BAD_REQUEST)
-            Follow.objects.create(user=request.user, author=author)
+            author.is_subscribed = True
+            serializer = SubscribeAuthorSerializer(
+                author, context={'request': request})
             return Response(serializer.data,
                             status=status.HTTP_201_CREATED)
 
-        try:
-            follow = Follow.objects.get(user=request.user, author=author)
-        except Follow.DoesNotExist:
+        author, deleted = toggle(Follow, 'author', request.user,
+                                 author_id, add=False)
+        if author is None:
+            raise Http404
+        if not deleted:
             return Response({'detail': 'Вы не подписаны'},
                             status=status.HTTP_400_BAD_REQUEST)
-        follow.delete()
         return Response({'detail': 'Успешная отписка'},
                         status=status.HTTP_204_NO_CONTENT)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(AsyncReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = [filters.SearchFilter]
@@ -119,20 +222,85 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(name__istartswith=name)
         return queryset
 
+    @method_decorator(catalogue_cache_control)
+    @method_decorator(condition(etag_func=ingredient_index.etag,
+                                last_modified_func=ingredient_index.modified))
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('search') is not None:
+            return super().list(request, *args, **kwargs)
+        name = request.query_params.get('name', None)
+        if name is None:
+            return Response(ingredient_index.all())
+        return Response(autocomplete(name, INGREDIENTS_SEARCH_LIMIT))
+
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(AsyncReadMixin, viewsets.ReadOnlyModelViewSet):
+    '''Теги отдаются из справочника в памяти процесса'''
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (AllowAny, )
 
+    @method_decorator(catalogue_cache_control)
+    @method_decorator(condition(etag_func=tag_catalogue.etag,
+                                last_modified_func=tag_catalogue.modified))
+    def list(self, request, *args, **kwargs):
+        return Response(tag_catalogue.all())
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            tag = tag_catalogue.get(int(kwargs[self.lookup_field]))
+        except ValueError:
+            tag = None
+        if tag is None:
+            raise Http404
+        return Response(tag)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AsyncReadMixin, AnonymousCacheMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = [AdminOrAuthorPermission, ]
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
-    pagination_class = CustomPaginator
+    pagination_class = KeysetPaginator
+    cache_prefix = 'recipes'
+    cache_models = (Recipe, IngredientRecipe, TagsRecipe, Tag, Ingredient,
+                    User)
+
+    @property
+    def cursor_ordering(self):
+        if self.action == 'match':
+            return MATCH_ORDERING
+        if self.action == 'feed':
+            return self.feed_ordering
+        params = self.request.query_params
+        if params.get('ordering') in RECIPE_ORDERINGS:
+            return RECIPE_ORDERINGS[params['ordering']]
+        if params.get('search'):
+            return SEARCH_ORDERING
+        return RECIPE_ORDERINGS[DEFAULT_RECIPE_ORDERING]
+
+    @property
+    def keyset_only(self):
+        return self.action == 'feed'
+
+    def get_queryset(self):
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'ingredientsRecipes__ingredient')
+        user = self.request.user
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return queryset.annotate(is_favorited=false,
+                                     is_in_shopping_cart=false,
+                                     is_subscribed=false)
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author'))))
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -145,24 +313,26 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(IsAuthenticated,))
     def favorite(self, request, **kwargs):
-        recipe = get_object_or_404(Recipe, id=kwargs['pk'])
-        serializer = UserRecipeSerializer(recipe, context={"request": request})
-
         if request.method == 'POST':
-            if Favorite.objects.filter(user=request.user,
-                                       recipe=recipe).exists():
+            recipe, created = toggle(Favorite, 'recipe', request.user,
+                                     kwargs['pk'], add=True,
+                                     fields=USER_RECIPE_FIELDS)
+            if recipe is None:
+                raise Http404
+            if not created:
                 return Response({'errors': 'Рецепт уже добавлен в избранное'},
                                 status=status.HTTP_400_BAD_REQUEST)
-            Favorite.objects.create(user=request.user, recipe=recipe)
+            serializer = UserRecipeSerializer(recipe,
+                                              context={"request": request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if not Favorite.objects.filter(user=request.user,
-                                       recipe=recipe).exists():
+        recipe, deleted = toggle(Favorite, 'recipe', request.user,
+                                 kwargs['pk'], add=False)
+        if recipe is None:
+            raise Http404
+        if not deleted:
             return Response({'errors': 'Рецепта нет в избранном'},
                             status=status.HTTP_400_BAD_REQUEST)
-        favorite = get_object_or_404(Favorite, user=request.user,
-                                     recipe=recipe)
-        favorite.delete()
         return Response({'detail': 'Рецепт удален из избранного'},
                         status=status.HTTP_204_NO_CONTENT)
 
@@ -170,51 +340,134 @@ class RecipeViewSet(viewsets.ModelViewSet):
             permission_classes=(IsAuthenticated,),
             pagination_class=None)
     def shopping_cart(self, request, **kwargs):
-        recipe = get_object_or_404(Recipe, id=kwargs['pk'])
         if request.method == 'POST':
-            serializer = UserRecipeSerializer(recipe, data=request.data,
-                                              context={"request": request})
-            serializer.is_valid()
-            if ShoppingCart.objects.filter(user=request.user,
-                                           recipe=recipe).exists():
+            recipe, created = toggle(ShoppingCart, 'recipe', request.user,
+                                     kwargs['pk'], add=True,
+                                     fields=USER_RECIPE_FIELDS)
+            if recipe is None:
+                raise Http404
+            if not created:
                 return Response(
                     {'errors': 'Рецепт уже добавлен в список покупок'},
                     status=status.HTTP_400_BAD_REQUEST)
-            ShoppingCart.objects.create(user=request.user, recipe=recipe)
+            bump_cart_generation(request.user.id)
+            serializer = UserRecipeSerializer(recipe,
+                                              context={"request": request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if not ShoppingCart.objects.filter(user=request.user,
-                                           recipe=recipe).exists():
+        recipe, deleted = toggle(ShoppingCart, 'recipe', request.user,
+                                 kwargs['pk'], add=False)
+        if recipe is None:
+            raise Http404
+        if not deleted:
             return Response(
                 {'errors': 'Рецепта не было в списке покупок'},
                 status=status.HTTP_400_BAD_REQUEST)
-        shopping_cart = get_object_or_404(ShoppingCart, user=request.user,
-                                          recipe=recipe)
-        shopping_cart.delete()
+        bump_cart_generation(request.user.id)
         return Response(
             {'detail': 'Рецепт удален из списка покупок'},
             status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=['post'],
+            permission_classes=(IsAuthenticated,),
+            parser_classes=(JSONLinesParser, JSONParser))
+    def bulk(self, request):
+        '''Пакетное создание рецептов текущего пользователя: JSON lines
+        или JSON-массив. Ошибки возвращаются по каждой записи.'''
+        if isinstance(request.data, list):
+            records = parse_list(request.data)
+        elif isinstance(request.data, dict):
+            return Response({'errors': 'Ожидается JSON-массив или JSON lines'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        else:
+            records = parse_lines(request.data)
+        results = list(import_recipes(limited(records, BULK_RECIPES_LIMIT),
+                                      BULK_CHUNK_SIZE, author=request.user))
+        created = sum('id' in result for result in results)
+        return Response(
+            {'created': created, 'failed': len(results) - created,
+             'results': results},
+            status=(status.HTTP_201_CREATED if created
+                    else status.HTTP_400_BAD_REQUEST))
+
+    @action(detail=False, permission_classes=(AllowAny,))
+    def match(self, request):
+        return self.cached_response(self.find_matches, request)
+
+    @action(detail=False, permission_classes=(IsAuthenticated, ))
+    def feed(self, request):
+        '''Рецепты авторов, на которых подписан пользователь, сначала
+        новые'''
+        queryset, self.feed_ordering = feed_recipes(self.get_queryset(),
+                                                    request.user)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def find_matches(self, request):
+        '''Рецепты по имеющимся продуктам: сначала те, для которых
+        меньше всего не хватает'''
+        params = MatchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = match_recipes(self.filter_queryset(self.get_queryset()),
+                                 params.validated_data['ingredients'])
+        if 'max_missing' in params.validated_data:
+            queryset = queryset.filter(
+                missing_count__lte=params.validated_data['max_missing'])
+        page = self.paginate_queryset(queryset)
+        serializer = MatchRecipeSerializer(
+            page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
     @action(
         detail=False,
-        permission_classes=[IsAuthenticated, ]
+        permission_classes=[IsAuthenticated, ],
+        renderer_classes=[PlainTextRenderer, CSVRenderer,
+                          JSONStreamRenderer]
     )
+    @method_decorator(condition(etag_func=shopping_cart_etag))
     def download_shopping_cart(self, request):
-        user = request.user
-        shopping_cart = IngredientRecipe.objects.filter(
-            recipe__shopping_cart_recipe__user=user)
-        ingredients = shopping_cart.values(
-            name=F('ingredient__name'),
-            measurement_unit=F('ingredient__measurement_unit')).annotate(
-            amount=Sum('amount'))
-
-        file_name = 'shopping_cart.txt'
-        response = HttpResponse(content_type='text/plain')
+        file_format = request.accepted_renderer.format
+        ingredients = shopping_cart_ingredients(request.user)
+        file_name = f'shopping_cart.{file_format}'
+        response = StreamingHttpResponse(
+            EXPORTERS[file_format](ingredients.iterator()),
+            content_type=(f'{request.accepted_renderer.media_type}; '
+                          f'charset=utf-8'))
         response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+        return response
 
-        for ingredient in ingredients:
-            response.write(
-                f"{ingredient['name']} - {ingredient['amount']}"
-                f" {ingredient['measurement_unit']}\n")
 
-        return response
+class MetricsView(APIView):
+    '''Метрики профилирования запросов по view (только для staff).
+    ?format=prometheus отдает их в текстовом формате Prometheus,
+    DELETE сбрасывает накопленные замеры.'''
+    permission_classes = (IsAdminUser, )
+    renderer_classes = (JSONRenderer, PrometheusRenderer)
+    pagination_class = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not settings.QUERY_PROFILING:
+            raise Http404
+
+    def get(self, request):
+        report = metrics.report()
+        if request.accepted_renderer.format == 'prometheus':
+            return Response(to_prometheus(report))
+        return Response(report)
+
+    def delete(self, request):
+        metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CacheStatsView(APIView):
+    '''Попадания и промахи кэша ответов (только для staff). Счетчики
+    хранятся в кэше Django, поэтому с общим кэшем они общие для всех
+    воркеров.'''
+    permission_classes = (IsAdminUser, )
+    pagination_class = None
+
+    def get(self, request):
+        return Response(get_stats())
@@ -22,6 +22,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'django_filters',
     'rest_framework.authtoken',
@@ -33,6 +34,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryProfilingMiddleware',
+    'api.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,10 +73,81 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Соединение живет DB_CONN_MAX_AGE секунд и переиспользуется
+        # следующими запросами; 0 - новое соединение на каждый запрос
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        # Для pgbouncer в режиме transaction: именованные курсоры
+        # .iterator() не переживают смену серверного соединения
+        'DISABLE_SERVER_SIDE_CURSORS': (
+            os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True'),
     }
 }
 
+# Реплики для чтения: DB_REPLICAS=host1:5432,host2 - те же база и
+# пользователь, что у основной, алиасы replica1, replica2, ...
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    host, _, port = address.strip().partition(':')
+    alias = f'replica{number}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host,
+                        'PORT': port or DATABASES['default']['PORT'],
+                        'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+# Сколько секунд после изменения клиент читает с основной базы
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+# Сколько секунд не использовать реплику после ошибки подключения
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
+
+# Проверять переиспользуемые соединения в начале запроса, чтобы
+# соединение, разорванное базой или пулером, не приводило к ошибке
+DB_CONN_HEALTH_CHECKS = (
+    os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True')
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+# LocMemCache у каждого процесса свой: поколение, сброшенное одним
+# воркером или командой manage.py, другие процессы не видят. Поэтому
+# с ним поколения живут CACHE_LOCAL_GENERATION_SECONDS, и изменения
+# доходят до остальных процессов не позже этого срока. С общим кэшем
+# (memcached, Redis) поколения бессрочны.
+CACHE_SHARED = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+CACHE_GENERATION_TIMEOUT = (
+    None if CACHE_SHARED
+    else int(os.getenv('CACHE_LOCAL_GENERATION_SECONDS', 60)))
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Сколько секунд токен с пользователем живет в кэше (0 - не кэшировать)
+# и сколько токенов держит кэш в памяти процесса
+TOKEN_CACHE_SECONDS = int(os.getenv('TOKEN_CACHE_SECONDS', 60))
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
+CATALOGUE_MAX_AGE = int(os.getenv('CATALOGUE_MAX_AGE', 60 * 5))
+
+FEED_MATERIALIZE_FOLLOWS = int(os.getenv('FEED_MATERIALIZE_FOLLOWS', 200))
+
+ASYNC_VIEWS = (os.getenv('ASYNC_VIEWS', 'False') == 'True')
+
+QUERY_PROFILING = (os.getenv('QUERY_PROFILING', 'False') == 'True')
+
+QUERY_PROFILING_WINDOW = int(os.getenv('QUERY_PROFILING_WINDOW', 1000))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -97,7 +171,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.TokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': [
         'api.pagination.CustomPaginator',
@@ -130,6 +204,12 @@ USE_TZ = (os.getenv('USE_TZ', 'True') == 'True')
 
 IMAGE_UPLOAD_PATH = 'recipes/'
 
+MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', 10 * 1024 * 1024))
+
+IMAGE_VARIANTS_ASYNC = (os.getenv('IMAGE_VARIANTS_ASYNC', 'True') == 'True')
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
 
 STATIC_URL = '/static/'
 
@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db.models import Q
 
+from api.search import search_query
 from . import models
 
 
@@ -21,13 +23,23 @@ class IngredientAdmin(admin.ModelAdmin):
 @admin.register(models.Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('pk', 'author', 'name', 'cooking_time',
-                    'text', 'image', 'get_ingredients')
+                    'text', 'image', 'get_ingredients', 'favorites_count',
+                    'in_carts_count')
     list_editable = (
         'author', 'name', 'cooking_time', 'text', 'image')
     list_filter = ('tags',)
     empty_value_display = '-пусто-'
     search_fields = ('name', 'author__username')
 
+    def get_search_results(self, request, queryset, search_term):
+        '''Полнотекстовый поиск по названию, описанию и ингредиентам
+        вместо ILIKE по search_fields, плюс точное имя автора'''
+        if not search_term:
+            return queryset, False
+        return queryset.filter(
+            Q(search_vector=search_query(search_term))
+            | Q(author__username=search_term)), False
+
     def get_ingredients(self, obj):
         return ", ".join(
             [ingredient.name for ingredient in obj.ingredients.all()])
@@ -0,0 +1,145 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import bump_generation
+
+
+def read_rows(path, fields):
+    '''Возвращает кортежи значений в порядке fields из CSV без
+    заголовка, JSON lines (.jsonl, объект на строку) или JSON-массива
+    объектов (.json). CSV и JSON lines читаются построчно, JSON-массив
+    загружается в память целиком'''
+    path = Path(path)
+    if not path.exists():
+        raise CommandError(f'Файл {path} не найден')
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.suffix == '.json':
+            for item in json.load(file):
+                yield tuple(item[field] for field in fields)
+            return
+        if path.suffix == '.jsonl':
+            for line in file:
+                if line.strip():
+                    item = json.loads(line)
+                    yield tuple(item[field] for field in fields)
+            return
+        for row in csv.reader(file, delimiter=',', quotechar='"'):
+            if row:
+                yield tuple(row[:len(fields)])
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+class BulkLoadCommand(BaseCommand):
+    '''Идемпотентная загрузка справочника пачками.
+
+    Строки, которые уже есть в базе (по уникальному ключу), пропускаются,
+    поэтому команду можно запускать при каждом деплое.'''
+    model = None
+    fields = ()
+    key_fields = ()
+    default_path = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=self.default_path,
+            help='CSV, JSON lines (.jsonl) или JSON-массив (.json); '
+                 'JSON-массив читается в память целиком, для больших '
+                 'файлов используйте CSV или JSON lines')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Показать отличия без записи в базу')
+        parser.add_argument('--copy', action='store_true',
+                            help='Загрузка через COPY (PostgreSQL)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = read_rows(options['path'], self.fields)
+        if options['dry_run']:
+            self.diff(rows)
+        else:
+            before = self.model.objects.count()
+            read = self.load(rows, options['batch_size'], options['copy'])
+            created = self.model.objects.count() - before
+            bump_generation(self.model._meta.label_lower)
+            self.stdout.write(self.style.SUCCESS(
+                f'Прочитано строк: {read}, добавлено: {created}, '
+                f'пропущено: {read - created}'))
+        self.stdout.write(f'Время: {time.monotonic() - started:.2f} с')
+
+    def load(self, rows, batch_size, copy):
+        read = 0
+        with transaction.atomic():
+            for batch in batches(rows, batch_size):
+                read += len(batch)
+                if copy:
+                    self.copy_batch(batch)
+                else:
+                    self.model.objects.bulk_create(
+                        (self.model(**dict(zip(self.fields, row)))
+                         for row in batch),
+                        ignore_conflicts=True)
+        return read
+
+    def copy_batch(self, batch):
+        '''COPY во временную таблицу и перенос с ON CONFLICT DO NOTHING'''
+        if connection.vendor != 'postgresql':
+            raise CommandError('--copy работает только с PostgreSQL')
+        table = self.model._meta.db_table
+        columns = ', '.join(
+            connection.ops.quote_name(field) for field in self.fields)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE IF NOT EXISTS staging_{table} '
+                f'(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP')
+            cursor.execute(f'TRUNCATE staging_{table}')
+            cursor.copy_expert(
+                f'COPY staging_{table} ({columns}) FROM STDIN '
+                f'WITH (FORMAT csv)', buffer)
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT DISTINCT {columns} FROM staging_{table} '
+                f'ON CONFLICT DO NOTHING')
+
+    def diff(self, rows):
+        existing = {
+            tuple(item[:len(self.key_fields)]): item
+            for item in self.model.objects.values_list(
+                *self.key_fields,
+                *(field for field in self.fields
+                  if field not in self.key_fields))}
+        new, changed, same = [], [], 0
+        for row in rows:
+            values = dict(zip(self.fields, row))
+            key = tuple(values[field] for field in self.key_fields)
+            ordered = key + tuple(values[field] for field in self.fields
+                                  if field not in self.key_fields)
+            if key not in existing:
+                new.append(ordered)
+            elif existing[key] != ordered:
+                changed.append((existing[key], ordered))
+            else:
+                same += 1
+        for row in new:
+            self.stdout.write(f'+ {row}')
+        for old, row in changed:
+            self.stdout.write(f'~ {old} -> {row}')
+        self.stdout.write(f'Новых: {len(new)}, отличаются: {len(changed)} '
+                          f'(не обновляются), без изменений: {same}')
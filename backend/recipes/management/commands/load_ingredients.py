@@ -1,22 +1,12 @@
-import csv
-
-from django.core.management import BaseCommand
+from django.conf import settings
 
+from recipes.loaders import BulkLoadCommand
 from recipes.models import Ingredient
 
 
-class Command(BaseCommand):
-    help = 'Загрузка ингридиентов'
-
-    def handle(self, *args, **options):
-
-        with open('ingredients.csv', newline='') as csvfile:
-            reader = csv.reader(csvfile, delimiter=',', quotechar='"')
-            for row in reader:
-                name = row[0]
-                measurement_unit = row[1]
-                ingredient = Ingredient(name=name,
-                                        measurement_unit=measurement_unit)
-                ingredient.save()
-
-        print('Успешная загрузка')
+class Command(BulkLoadCommand):
+    help = 'Загрузка ингридиентов из CSV, JSON lines или JSON'
+    model = Ingredient
+    fields = ('name', 'measurement_unit')
+    key_fields = ('name', 'measurement_unit')
+    default_path = settings.BASE_DIR / 'ingredients.csv'
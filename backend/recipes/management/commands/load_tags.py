@@ -1,24 +1,12 @@
-import csv
-
-from django.core.management import BaseCommand
+from django.conf import settings
 
+from recipes.loaders import BulkLoadCommand
 from recipes.models import Tag
 
 
-class Command(BaseCommand):
-    help = 'Загрузка тегов'
-
-    def handle(self, *args, **options):
-
-        with open('tags.csv', newline='') as csvfile:
-            reader = csv.reader(csvfile, delimiter=',', quotechar='"')
-            for row in reader:
-                name = row[0]
-                color = row[1]
-                slug = row[2]
-                tag = Tag(name=name,
-                          color=color,
-                          slug=slug)
-                tag.save()
-
-        print('Успешная загрузка')
+class Command(BulkLoadCommand):
+    help = 'Загрузка тегов из CSV, JSON lines или JSON'
+    model = Tag
+    fields = ('name', 'color', 'slug')
+    key_fields = ('slug',)
+    default_path = settings.BASE_DIR / 'tags.csv'
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:47
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicates(apps, schema_editor):
+    for model_name, fields in (('Favorite', ('user', 'recipe')),
+                               ('TagsRecipe', ('tag', 'recipe'))):
+        model = apps.get_model('recipes', model_name)
+        duplicates = model.objects.values(*fields).annotate(
+            keep=Min('id'), total=Count('id')).filter(total__gt=1)
+        for duplicate in duplicates:
+            model.objects.filter(
+                **{field: duplicate[field] for field in fields}
+            ).exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_ingredient_name_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-pub_date'], name='favorite_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['user', '-pub_date'], name='cart_user_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='Unique favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='tagsrecipe',
+            constraint=models.UniqueConstraint(fields=('tag', 'recipe'), name='Unique recipe tag'),
+        ),
+    ]
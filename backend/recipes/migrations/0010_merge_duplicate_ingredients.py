@@ -0,0 +1,42 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:49
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    '''Повторно загруженные ингредиенты сливаются в самый ранний,
+    ссылки из рецептов переносятся на него'''
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit').annotate(
+        keep=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        extra = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=duplicate['keep'])
+        for row in IngredientRecipe.objects.filter(ingredient__in=extra):
+            kept = IngredientRecipe.objects.filter(
+                recipe_id=row.recipe_id,
+                ingredient_id=duplicate['keep']).first()
+            if kept is None:
+                row.ingredient_id = duplicate['keep']
+                row.save(update_fields=['ingredient'])
+            else:
+                kept.amount += row.amount
+                kept.save(update_fields=['amount'])
+                row.delete()
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
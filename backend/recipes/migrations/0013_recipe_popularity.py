@@ -0,0 +1,35 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:58
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['pub_date'], name='favorite_date_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cooking_time', '-id'], name='recipe_cooking_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['pub_date'], name='cart_date_brin'),
+        ),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:07
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Вектор складывается из названия (вес A), названий ингредиентов (B)
+# и описания (C). Рецепт пересчитывается триггером при изменении
+# названия или описания, а также при любых изменениях его ингредиентов
+# и переименовании ингредиента; триггеры на связях срабатывают один раз
+# на запрос, поэтому bulk_create не пересчитывает рецепт построчно.
+SEARCH_SQL = '''
+CREATE FUNCTION recipe_search_vector(recipe_id bigint, recipe_name text,
+                                     recipe_text text)
+RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('russian', coalesce(recipe_name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_ingredientrecipe AS link
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = link.ingredient_id
+            WHERE link.recipe_id = $1), '')), 'B')
+        || setweight(to_tsvector('russian', coalesce(recipe_text, '')), 'C')
+$$;
+
+CREATE FUNCTION recipe_search_vector_row() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := recipe_search_vector(NEW.id, NEW.name, NEW.text);
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER recipe_search_vector_row
+BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+FOR EACH ROW EXECUTE FUNCTION recipe_search_vector_row();
+
+CREATE FUNCTION recipe_search_vector_links() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE recipes_recipe
+        SET search_vector = recipe_search_vector(id, name, text)
+        WHERE id IN (SELECT recipe_id FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE recipes_recipe
+        SET search_vector = recipe_search_vector(id, name, text)
+        WHERE id IN (SELECT recipe_id FROM old_rows);
+    ELSE
+        UPDATE recipes_recipe
+        SET search_vector = recipe_search_vector(id, name, text)
+        WHERE id IN (SELECT recipe_id FROM new_rows
+                     UNION SELECT recipe_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER recipe_search_vector_links_insert
+AFTER INSERT ON recipes_ingredientrecipe
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION recipe_search_vector_links();
+
+CREATE TRIGGER recipe_search_vector_links_update
+AFTER UPDATE ON recipes_ingredientrecipe
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION recipe_search_vector_links();
+
+CREATE TRIGGER recipe_search_vector_links_delete
+AFTER DELETE ON recipes_ingredientrecipe
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION recipe_search_vector_links();
+
+CREATE FUNCTION recipe_search_vector_ingredients() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE recipes_recipe
+    SET search_vector = recipe_search_vector(id, name, text)
+    WHERE id IN (
+        SELECT link.recipe_id FROM recipes_ingredientrecipe AS link
+        JOIN new_rows ON new_rows.id = link.ingredient_id
+        JOIN old_rows ON old_rows.id = new_rows.id
+        WHERE new_rows.name IS DISTINCT FROM old_rows.name);
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER recipe_search_vector_ingredients
+AFTER UPDATE ON recipes_ingredient
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION recipe_search_vector_ingredients();
+
+UPDATE recipes_recipe
+SET search_vector = recipe_search_vector(id, name, text);
+'''
+
+REVERSE_SEARCH_SQL = '''
+DROP TRIGGER recipe_search_vector_ingredients ON recipes_ingredient;
+DROP TRIGGER recipe_search_vector_links_delete ON recipes_ingredientrecipe;
+DROP TRIGGER recipe_search_vector_links_update ON recipes_ingredientrecipe;
+DROP TRIGGER recipe_search_vector_links_insert ON recipes_ingredientrecipe;
+DROP TRIGGER recipe_search_vector_row ON recipes_recipe;
+DROP FUNCTION recipe_search_vector_ingredients();
+DROP FUNCTION recipe_search_vector_links();
+DROP FUNCTION recipe_search_vector_row();
+DROP FUNCTION recipe_search_vector(bigint, text, text);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ),
+        migrations.RunSQL(SEARCH_SQL, REVERSE_SEARCH_SQL),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:10
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+# recipes_recipe.ingredient_ids - отсортированный массив id ингредиентов
+# рецепта; пересчитывается триггером один раз на запрос к связям.
+INGREDIENT_IDS_SQL = '''
+CREATE FUNCTION recipe_ingredient_ids(recipe_id bigint)
+RETURNS bigint[] LANGUAGE sql STABLE AS $$
+    SELECT ARRAY(
+        SELECT ingredient_id FROM recipes_ingredientrecipe
+        WHERE recipe_id = $1 ORDER BY ingredient_id)
+$$;
+
+CREATE FUNCTION recipe_ingredient_ids_links() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE recipes_recipe SET ingredient_ids = recipe_ingredient_ids(id)
+        WHERE id IN (SELECT recipe_id FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE recipes_recipe SET ingredient_ids = recipe_ingredient_ids(id)
+        WHERE id IN (SELECT recipe_id FROM old_rows);
+    ELSE
+        UPDATE recipes_recipe SET ingredient_ids = recipe_ingredient_ids(id)
+        WHERE id IN (SELECT recipe_id FROM new_rows
+                     UNION SELECT recipe_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER recipe_ingredient_ids_links_insert
+AFTER INSERT ON recipes_ingredientrecipe
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION recipe_ingredient_ids_links();
+
+CREATE TRIGGER recipe_ingredient_ids_links_update
+AFTER UPDATE ON recipes_ingredientrecipe
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION recipe_ingredient_ids_links();
+
+CREATE TRIGGER recipe_ingredient_ids_links_delete
+AFTER DELETE ON recipes_ingredientrecipe
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION recipe_ingredient_ids_links();
+
+UPDATE recipes_recipe SET ingredient_ids = recipe_ingredient_ids(id);
+'''
+
+REVERSE_INGREDIENT_IDS_SQL = '''
+DROP TRIGGER recipe_ingredient_ids_links_delete ON recipes_ingredientrecipe;
+DROP TRIGGER recipe_ingredient_ids_links_update ON recipes_ingredientrecipe;
+DROP TRIGGER recipe_ingredient_ids_links_insert ON recipes_ingredientrecipe;
+DROP FUNCTION recipe_ingredient_ids_links();
+DROP FUNCTION recipe_ingredient_ids(bigint);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, editable=False, size=None, verbose_name='Ингредиенты (id)'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ingredient_ids'], name='recipe_ingredient_ids_idx'),
+        ),
+        migrations.RunSQL(INGREDIENT_IDS_SQL, REVERSE_INGREDIENT_IDS_SQL),
+    ]
@@ -0,0 +1,149 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Записи готовых лент: при добавлении рецепта он попадает в ленты
+# подписчиков автора, у которых лента материализована; при подписке
+# и отписке добавляются и удаляются рецепты автора. Триггеры на
+# вставку и удаление срабатывают один раз на запрос.
+FEED_SQL = '''
+CREATE FUNCTION feed_recipes_insert() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO recipes_feedentry (feed_id, recipe_id, pub_date)
+    SELECT feed.user_id, new_rows.id, new_rows.pub_date
+    FROM new_rows
+    JOIN users_follow AS follow ON follow.author_id = new_rows.author_id
+    JOIN recipes_materializedfeed AS feed ON feed.user_id = follow.user_id
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER feed_recipes_insert
+AFTER INSERT ON recipes_recipe
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION feed_recipes_insert();
+
+CREATE FUNCTION feed_recipes_author() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM recipes_feedentry WHERE recipe_id = NEW.id;
+    INSERT INTO recipes_feedentry (feed_id, recipe_id, pub_date)
+    SELECT feed.user_id, NEW.id, NEW.pub_date
+    FROM users_follow AS follow
+    JOIN recipes_materializedfeed AS feed ON feed.user_id = follow.user_id
+    WHERE follow.author_id = NEW.author_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER feed_recipes_author
+AFTER UPDATE OF author_id ON recipes_recipe
+FOR EACH ROW WHEN (OLD.author_id IS DISTINCT FROM NEW.author_id)
+EXECUTE FUNCTION feed_recipes_author();
+
+CREATE FUNCTION feed_follows_insert() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO recipes_feedentry (feed_id, recipe_id, pub_date)
+    SELECT feed.user_id, recipe.id, recipe.pub_date
+    FROM new_rows
+    JOIN recipes_materializedfeed AS feed ON feed.user_id = new_rows.user_id
+    JOIN recipes_recipe AS recipe ON recipe.author_id = new_rows.author_id
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END
+$$;
+
+CREATE FUNCTION feed_follows_delete() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM recipes_feedentry AS entry
+    USING old_rows, recipes_recipe AS recipe
+    WHERE entry.feed_id = old_rows.user_id
+        AND entry.recipe_id = recipe.id
+        AND recipe.author_id = old_rows.author_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER feed_follows_insert
+AFTER INSERT ON users_follow
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION feed_follows_insert();
+
+CREATE TRIGGER feed_follows_update_delete
+AFTER UPDATE ON users_follow
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION feed_follows_delete();
+
+CREATE TRIGGER feed_follows_update_insert
+AFTER UPDATE ON users_follow
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION feed_follows_insert();
+
+CREATE TRIGGER feed_follows_delete
+AFTER DELETE ON users_follow
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION feed_follows_delete();
+'''
+
+REVERSE_FEED_SQL = '''
+DROP TRIGGER feed_follows_delete ON users_follow;
+DROP TRIGGER feed_follows_update_insert ON users_follow;
+DROP TRIGGER feed_follows_update_delete ON users_follow;
+DROP TRIGGER feed_follows_insert ON users_follow;
+DROP TRIGGER feed_recipes_author ON recipes_recipe;
+DROP TRIGGER feed_recipes_insert ON recipes_recipe;
+DROP FUNCTION feed_follows_delete();
+DROP FUNCTION feed_follows_insert();
+DROP FUNCTION feed_recipes_author();
+DROP FUNCTION feed_recipes_insert();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('recipes', '0015_recipe_ingredient_ids'),
+        ('users', '0006_author_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterializedFeed',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='materialized_feed', serialize=False, to='auth.user', verbose_name='Пользователь')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Готовая лента',
+                'verbose_name_plural': 'Готовые ленты',
+            },
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации рецепта')),
+                ('feed', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='recipes.materializedfeed', verbose_name='Лента')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['feed', '-pub_date', '-recipe'], name='feed_entry_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('feed', 'recipe'), name='unique_feed_entry'),
+        ),
+        migrations.RunSQL(FEED_SQL, REVERSE_FEED_SQL),
+    ]
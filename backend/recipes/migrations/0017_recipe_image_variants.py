@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_materialized_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Варианты картинки'),
+        ),
+    ]
@@ -1,5 +1,9 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import BrinIndex, GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Upper
 
 from api.constants import MAX_LENGTH_NAME, MAX_LENGTH_COLOR
 
@@ -43,12 +47,24 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        indexes = [
+            models.Index(OpClass(Upper('name'), name='text_pattern_ops'),
+                         name='ingredient_name_upper_idx'),
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'],
+                     name='ingredient_name_trgm_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=('name', 'measurement_unit',),
+                                    name='Unique ingredient')]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
 
 class Recipe(models.Model):
+    COMPUTED_FIELDS = ('favorites_count', 'in_carts_count', 'popularity',
+                       'search_vector', 'ingredient_ids', 'image_variants')
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -61,6 +77,14 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
     )
+    # Имя картинки, для которой построены уменьшенная копия и
+    # WebP-версия; пока оно не совпадает с image, отдается оригинал.
+    image_variants = models.CharField(
+        verbose_name='Варианты картинки',
+        max_length=100,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(verbose_name='Описание')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -80,20 +104,76 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False,
+    )
+    popularity = models.FloatField(
+        verbose_name='Популярность',
+        default=0,
+        editable=False,
+    )
+    # Заполняется триггерами базы по названию, описанию и названиям
+    # ингредиентов (миграция 0014_recipe_search_vector).
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+    # Отсортированные id ингредиентов рецепта - инвертированный индекс
+    # для подбора рецептов по продуктам; заполняется триггерами базы
+    # (миграция 0015_recipe_ingredient_ids).
+    ingredient_ids = ArrayField(
+        models.BigIntegerField(),
+        verbose_name='Ингредиенты (id)',
+        default=list,
+        editable=False,
+    )
 
     class Meta:
         ordering = ["-pub_date"]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_date_idx'),
+            models.Index(fields=['-popularity', '-id'],
+                         name='recipe_popularity_idx'),
+            models.Index(fields=['cooking_time', '-id'],
+                         name='recipe_cooking_time_idx'),
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+            GinIndex(fields=['ingredient_ids'],
+                     name='recipe_ingredient_ids_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Счетчики и популярность обновляются отдельными запросами,
+        # поэтому при обычном сохранении их прочитанные ранее значения
+        # не пишутся.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COMPUTED_FIELDS]
+        super().save(*args, **kwargs)
+
 
 class TagsRecipe(models.Model):
 
+    # Отдельный индекс по tag_id не нужен: его покрывает уникальный
+    # индекс (tag, recipe)
     tag = models.ForeignKey(
-        Tag, verbose_name='Теги в рецепте', on_delete=models.CASCADE
+        Tag, verbose_name='Теги в рецепте', on_delete=models.CASCADE,
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe, verbose_name='Рецепт с тегами',
@@ -103,6 +183,9 @@ class TagsRecipe(models.Model):
     class Meta:
         verbose_name = 'Тег в рецепте'
         verbose_name_plural = 'Теги в рецепте'
+        constraints = [
+            models.UniqueConstraint(fields=('tag', 'recipe',),
+                                    name='Unique recipe tag')]
 
 
 class IngredientRecipe(models.Model):
@@ -140,11 +223,13 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Избранный рецепт',
     )
+    # Индексы по user_id - (user, recipe) и (user, -pub_date)
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         verbose_name='Пользователь',
         related_name='favorite',
+        db_index=False,
     )
     pub_date = models.DateTimeField(
         verbose_name='Дата добавления',
@@ -155,6 +240,14 @@ class Favorite(models.Model):
         ordering = ["-pub_date"]
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'recipe',),
+                                    name='Unique favorite')]
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='favorite_user_date_idx'),
+            BrinIndex(fields=['pub_date'], name='favorite_date_brin'),
+        ]
 
     def __str__(self):
         return f'{self.user} favorite {self.recipe}'
@@ -167,11 +260,13 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт в списке покупок',
     )
+    # Индекс по user_id - (user, -pub_date)
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         verbose_name='Пользователь',
         related_name='shopping_cart_user',
+        db_index=False,
     )
     pub_date = models.DateTimeField(
         verbose_name='Дата добавления',
@@ -191,6 +286,68 @@ class ShoppingCart(models.Model):
                 name='Unique shopping cart',
             ),
         )
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='cart_user_date_idx'),
+            BrinIndex(fields=['pub_date'], name='cart_date_brin'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.user} -> {self.recipe}'
+
+
+class MaterializedFeed(models.Model):
+    '''Пользователь, лента которого хранится готовой в FeedEntry.
+    Записи ленты добавляются и удаляются триггерами PostgreSQL при
+    изменении рецептов и подписок.'''
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='materialized_feed',
+        verbose_name='Пользователь',
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата создания',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = 'Готовая лента'
+        verbose_name_plural = 'Готовые ленты'
+
+    def __str__(self) -> str:
+        return f'{self.user}'
+
+
+class FeedEntry(models.Model):
+    feed = models.ForeignKey(
+        MaterializedFeed,
+        on_delete=models.CASCADE,
+        related_name='entries',
+        verbose_name='Лента',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(fields=('feed', 'recipe'),
+                                    name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['feed', '-pub_date', '-recipe'],
+                         name='feed_entry_date_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.feed} -> {self.recipe}'
@@ -7,3 +7,11 @@ from . import models
 class FollowAdmin(admin.ModelAdmin):
     list_display = ['user', 'author']
     search_fields = ['user__first_name', 'user__last_name', 'user__username']
+
+
+@admin.register(models.AuthorStats)
+class AuthorStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'recipes_count']
+    readonly_fields = ['user', 'recipes_count']
+    search_fields = ['user__username']
+    ordering = ['-recipes_count']
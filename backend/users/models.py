@@ -27,3 +27,18 @@ class Follow(models.Model):
 
     def __str__(self) -> str:
         return f'{self.user} {self.author}'
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True,
+        related_name='author_stats', verbose_name='Автор')
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self) -> str:
+        return f'{self.user}: {self.recipes_count}'